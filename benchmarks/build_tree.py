@@ -0,0 +1,55 @@
+"""
+Times MethodRouter tree building for growing numbers of exposed methods
+
+Startup cost should grow linearly with the number of endpoints, so the time per
+endpoint printed for each size should stay roughly flat.
+
+Usage: PYTHONPATH=. python benchmarks/build_tree.py [endpoints]
+"""
+
+import sys
+import time
+from typing import Type
+
+from tonberry import create_app, expose
+from tonberry.expose import _Expose
+
+METHODS_PER_CLASS = 100
+
+
+def make_root(endpoints: int) -> Type:
+    lines = []
+    classes = max(endpoints // METHODS_PER_CLASS, 1)
+    for class_num in range(classes):
+        lines.append(f"class Child{class_num}:")
+        for method_num in range(METHODS_PER_CLASS):
+            lines.append("    @expose.get")
+            lines.append(f"    async def endpoint_{method_num}(self): return 'ok'")
+    lines.append("class Root:")
+    for class_num in range(classes):
+        lines.append(f"    child_{class_num} = Child{class_num}()")
+    namespace = {"__name__": "build_tree_benchmark", "expose": expose}
+    exec("\n".join(lines), namespace)
+    return namespace["Root"]  # type: ignore
+
+
+def bench(endpoints: int) -> float:
+    _Expose._new_registrar()
+    root = make_root(endpoints)
+    app = create_app()
+    start = time.perf_counter()
+    app.routers[0].root = root()  # type: ignore
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    largest = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    sizes = sorted({largest // 8, largest // 4, largest // 2, largest})
+    print(f"{'endpoints':>10} {'total (s)':>10} {'per endpoint (us)':>18}")
+    for endpoints in sizes:
+        elapsed = bench(endpoints)
+        print(f"{endpoints:>10} {elapsed:>10.4f} {elapsed / endpoints * 1e6:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
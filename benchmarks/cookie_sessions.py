@@ -0,0 +1,41 @@
+"""
+Times signing and verifying session cookies for a few payload sizes and shows
+how big the cookies get with and without compression kicking in
+
+Usage: PYTHONPATH=. python benchmarks/cookie_sessions.py [iterations]
+"""
+
+import sys
+import time
+
+from tonberry.cookie_sessions import SessionSigner
+
+PAYLOADS = {
+    "small": {"user_id": 1234, "role": "admin"},
+    "medium": {
+        "user_id": 1234,
+        "cart": [{"sku": f"SKU-{n}", "qty": 1} for n in range(10)],
+    },
+    "large": {"user_id": 1234, "history": [f"/products/{n}" for n in range(150)]},
+}
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    signer = SessionSigner(["current secret", "previous secret"], max_age=1800)
+    print(f"{'payload':>8} {'cookie bytes':>12} {'sign (us)':>10} {'verify (us)':>11}")
+    for name, data in PAYLOADS.items():
+        value = signer.dumps(data)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            signer.dumps(data)
+        sign = (time.perf_counter() - start) / iterations
+        start = time.perf_counter()
+        for _ in range(iterations):
+            signer.loads(value)
+        verify = (time.perf_counter() - start) / iterations
+        print(f"{name:>8} {len(value):>12} {sign * 1e6:>10.1f} {verify * 1e6:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Times binding a bulk POST payload to nested dataclasses with the compiled
+binders, and with dacite.from_dict when dacite is installed for comparison
+
+Usage: PYTHONPATH=. python benchmarks/dataclass_binding.py [rows]
+"""
+
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from tonberry.binders import get_binder
+
+
+@dataclass
+class Address:
+    street: str
+    city: str
+    postcode: Optional[str] = None
+
+
+@dataclass
+class Row:
+    id: int
+    name: str
+    price: float
+    tags: List[str]
+    address: Address
+    attributes: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class BulkUpload:
+    rows: List[Row]
+    source: str
+
+
+def make_payload(rows: int) -> Dict[str, Any]:
+    return {
+        "source": "benchmark",
+        "rows": [
+            {
+                "id": num,
+                "name": f"row {num}",
+                "price": num * 1.5,
+                "tags": ["a", "b", "c"],
+                "address": {"street": f"{num} Main St", "city": "Springfield"},
+                "attributes": {"width": num, "height": num * 2},
+            }
+            for num in range(rows)
+        ],
+    }
+
+
+def best_of(func: Callable[[], Any], runs: int = 5) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    payload = make_payload(rows)
+    binder = get_binder(BulkUpload)
+    compiled = best_of(lambda: binder(payload))
+    print(f"rows: {rows}")
+    print(f"compiled binder: {compiled * 1000:8.1f} ms")
+    try:
+        import dacite
+    except ImportError:
+        print("dacite is not installed, skipping the comparison")
+        return
+    from_dict = best_of(lambda: dacite.from_dict(BulkUpload, payload))
+    print(f"dacite.from_dict: {from_dict * 1000:8.1f} ms")
+    print(f"speedup: {from_dict / compiled:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
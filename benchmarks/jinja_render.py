@@ -0,0 +1,102 @@
+"""
+Times rendering a template the old way, with a new Environment per call, next
+to the shared environment, and how long a fresh process takes for its first
+render with and without the bytecode cache
+
+Usage: PYTHONPATH=. python benchmarks/jinja_render.py [renders]
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from tonberry import util
+from tonberry.util import Jinja
+
+TEMPLATE = """
+<html>
+<head><title>{{ title }}</title></head>
+<body>
+{% for section in sections %}
+  <h2>{{ section.name | title }}</h2>
+  <table>
+  {% for row in section.rows %}
+    <tr class="{{ loop.cycle('odd', 'even') }}">
+      <td>{{ row.id }}</td><td>{{ row.name | e }}</td>
+      <td>{% if row.active %}yes{% else %}no{% endif %}</td>
+    </tr>
+  {% endfor %}
+  </table>
+{% endfor %}
+{% macro footer(year) %}<footer>&copy; {{ year }}</footer>{% endmacro %}
+{{ footer(2024) }}
+</body>
+</html>
+"""
+
+CONTEXT = {
+    "title": "Report",
+    "sections": [
+        {
+            "name": f"section {number}",
+            "rows": [
+                {"id": row, "name": f"row <{row}>", "active": row % 2 == 0}
+                for row in range(10)
+            ],
+        }
+        for number in range(3)
+    ],
+}
+
+
+def old_render(template_path: Path) -> str:
+    environment = Environment(
+        loader=FileSystemLoader(template_path),
+        autoescape=select_autoescape(["html", "xml"]),
+    )
+    return environment.get_template("report.html").render(**CONTEXT)
+
+
+def first_render(template_path: Path, cache_dir: str = None) -> float:
+    # Forget the shared environments so this behaves like a new process
+    util._environments.clear()
+    start = time.perf_counter()
+    Jinja(template_path, bytecode_cache_dir=cache_dir)("report.html", CONTEXT).render()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    renders = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    with tempfile.TemporaryDirectory() as temp_dir:
+        template_path = Path(temp_dir)
+        (template_path / "report.html").write_text(TEMPLATE)
+        cache_dir = template_path / "bytecode"
+        cache_dir.mkdir()
+
+        start = time.perf_counter()
+        for _ in range(renders):
+            old_render(template_path)
+        old = (time.perf_counter() - start) / renders
+
+        jinja = Jinja(template_path)
+        start = time.perf_counter()
+        for _ in range(renders):
+            jinja("report.html", CONTEXT).render()
+        shared = (time.perf_counter() - start) / renders
+
+        print(f"renders: {renders}")
+        print(f"new environment per call: {old * 1e6:8.1f} us")
+        print(f"shared environment:       {shared * 1e6:8.1f} us  {old / shared:.1f}x")
+
+        cold = first_render(template_path)
+        first_render(template_path, str(cache_dir))
+        warm = first_render(template_path, str(cache_dir))
+        print(f"first render, no bytecode cache:   {cold * 1e3:6.2f} ms")
+        print(f"first render, warm bytecode cache: {warm * 1e3:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compares rendering a large report page in one go with streaming it through
+Jinja.generate, reporting the time until the first chunk is ready, the total
+time and the peak memory allocated while rendering
+
+Usage: PYTHONPATH=. python benchmarks/jinja_streaming.py [rows]
+"""
+
+import asyncio
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import AsyncIterator, Callable, Tuple
+
+from tonberry.util import Jinja, shutdown_executor
+
+TEMPLATE = """
+<table>
+{% for row in rows %}
+  <tr><td>{{ row.id }}</td><td>{{ row.name | e }}</td><td>{{ row.total }}</td></tr>
+{% endfor %}
+</table>
+"""
+
+
+async def render(jinja: Jinja) -> AsyncIterator[str]:
+    yield await jinja.render_async()
+
+
+async def measure(chunks: AsyncIterator[str]) -> Tuple[float, float, int, int]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = 0.0
+    size = 0
+    async for chunk in chunks:
+        if not first:
+            first = time.perf_counter() - start
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first, elapsed, size, peak
+
+
+async def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    context = {
+        "rows": [
+            {"id": num, "name": f"row <{num}>", "total": num * 1.5}
+            for num in range(rows)
+        ]
+    }
+    modes: Tuple[Tuple[str, Callable[[Jinja], AsyncIterator[str]]], ...] = (
+        ("render", render),
+        ("stream", lambda jinja: jinja.generate()),
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        (Path(temp_dir) / "report.html").write_text(TEMPLATE)
+        jinja = Jinja(Path(temp_dir))
+        jinja.precompile()
+        print(
+            f"{'mode':>15} {'first (ms)':>10} {'total (ms)':>10} {'chars':>10} "
+            f"{'peak (MB)':>9}"
+        )
+        for threaded in (False, True):
+            for name, chunks in modes:
+                page = jinja("report.html", context, threaded=threaded)
+                first, elapsed, size, peak = await measure(chunks(page))
+                label = f"{name}{' threaded' if threaded else ''}"
+                print(
+                    f"{label:>15} {first * 1e3:>10.1f} {elapsed * 1e3:>10.1f} "
+                    f"{size:>10} {peak / 1e6:>9.1f}"
+                )
+    shutdown_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
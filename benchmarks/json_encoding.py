@@ -0,0 +1,81 @@
+"""
+Times encoding a list of row dataclasses to JSON the old way, through
+dataclasses.asdict, next to the compiled serializers and orjson when it is
+installed
+
+Usage: PYTHONPATH=. python benchmarks/json_encoding.py [rows]
+"""
+
+import json
+import sys
+import time
+from dataclasses import asdict, dataclass, field, is_dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from tonberry import serializers
+
+
+@dataclass
+class Address:
+    street: str
+    city: str
+    postcode: Optional[str] = None
+
+
+@dataclass
+class Row:
+    id: int
+    name: str
+    price: float
+    tags: List[str]
+    address: Address
+    attributes: Dict[str, int] = field(default_factory=dict)
+
+
+class AsDictEncoder(json.JSONEncoder):
+    def default(self, obj: Any) -> Any:
+        if is_dataclass(obj) and not isinstance(obj, type):
+            return asdict(obj)
+        return json.JSONEncoder.default(self, obj)
+
+
+def make_rows(rows: int) -> List[Row]:
+    return [
+        Row(
+            id=num,
+            name=f"row {num}",
+            price=num * 1.5,
+            tags=["a", "b", "c"],
+            address=Address(street=f"{num} Main St", city="Springfield"),
+            attributes={"width": num, "height": num * 2},
+        )
+        for num in range(rows)
+    ]
+
+
+def best_of(func: Callable[[], Any], runs: int = 5) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    data = make_rows(rows)
+    old = best_of(lambda: json.dumps(data, cls=AsDictEncoder).encode("utf-8"))
+    print(f"rows: {rows}")
+    print(f"asdict encoder:      {old * 1000:8.1f} ms")
+    compiled = best_of(lambda: serializers._stdlib_dumps(data))
+    print(f"compiled serializer: {compiled * 1000:8.1f} ms  {old / compiled:.1f}x")
+    if serializers.orjson is None:
+        print("orjson is not installed, skipping the comparison")
+        return
+    fast = best_of(lambda: serializers._orjson_dumps(data))
+    print(f"orjson backend:      {fast * 1000:8.1f} ms  {old / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Measures how long the event loop is held up while a large JSON result is
+encoded inline, on the executor and streamed with serializers.iterencode, by
+timing a task that wakes up every millisecond alongside the encoding
+
+The rows are dataclasses, plain dicts and plain dicts wrapped in a single key
+dict, the last two never leave the C encoder so the thread holds the GIL
+
+Usage: PYTHONPATH=. python benchmarks/json_offload.py [rows]
+"""
+
+import asyncio
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, List
+
+from tonberry.serializers import dumps, iterencode
+from tonberry.util import run_in_executor, shutdown_executor
+
+CHUNK_SIZE = 65536
+
+
+@dataclass
+class Row:
+    id: int
+    name: str
+    price: float
+    tags: List[str]
+
+
+async def inline(data: Any) -> int:
+    return len(dumps(data))
+
+
+async def thread(data: Any) -> int:
+    return len(await run_in_executor(dumps, data))
+
+
+async def stream(data: Any) -> int:
+    size = 0
+    async for chunk in iterencode(data, CHUNK_SIZE):
+        size += len(chunk)
+    return size
+
+
+async def ticker(stop: asyncio.Event, gaps: List[float]) -> None:
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(0.001)
+        now = time.perf_counter()
+        gaps.append(now - last)
+        last = now
+
+
+async def measure(encode: Callable[[Any], Awaitable[int]], data: Any) -> None:
+    stop = asyncio.Event()
+    gaps: List[float] = []
+    task = asyncio.create_task(ticker(stop, gaps))
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    size = await encode(data)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await task
+    print(
+        f"{encode.__name__:>7} {size:>10} {elapsed * 1e3:>10.1f} "
+        f"{max(gaps) * 1e3:>14.1f}"
+    )
+
+
+async def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    dicts = [
+        {"id": num, "name": f"row {num}", "price": num * 1.5, "tags": ["a", "b"]}
+        for num in range(rows)
+    ]
+    cases = {
+        "dataclass rows": [
+            Row(num, f"row {num}", num * 1.5, ["a", "b"]) for num in range(rows)
+        ],
+        "dict rows": dicts,
+        "wrapped dict rows": {"rows": dicts},
+    }
+    for name, data in cases.items():
+        print(name)
+        print(f"{'mode':>7} {'bytes':>10} {'total (ms)':>10} {'max stall (ms)':>14}")
+        for encode in (inline, thread, stream):
+            await measure(encode, data)
+    shutdown_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
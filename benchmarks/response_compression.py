@@ -0,0 +1,74 @@
+"""
+Shows the bytes saved and the time taken to compress typical handler responses
+at different compression levels, both in one go and streamed in 64KB chunks
+that are flushed one at a time the way compress_stream sends them
+
+Usage: PYTHONPATH=. python benchmarks/response_compression.py
+"""
+
+import asyncio
+import json
+import time
+from typing import AsyncIterator, List, Tuple
+
+from tonberry.compression import RESPONSE_ENCODINGS, compress_bytes, compress_stream
+
+LEVELS = (1, 6, 9)
+RUNS = 10
+CHUNK_SIZE = 64 * 1024
+OFFLOAD_SIZE = 256 * 1024
+
+
+def payloads() -> List[Tuple[str, bytes]]:
+    records = [
+        {"id": number, "name": f"user {number}", "active": number % 3 == 0}
+        for number in range(20000)
+    ]
+    rows = "".join(
+        f"<tr><td>{number}</td><td>user {number}</td></tr>" for number in range(5000)
+    )
+    return [
+        ("json", json.dumps(records).encode("utf-8")),
+        ("html", f"<html><body><table>{rows}</table></body></html>".encode("utf-8")),
+    ]
+
+
+async def chunks(data: bytes) -> AsyncIterator[bytes]:
+    for position in range(0, len(data), CHUNK_SIZE):
+        yield data[position : position + CHUNK_SIZE]
+
+
+async def streamed_size(data: bytes, encoding: str, level: int) -> int:
+    size = 0
+    async for chunk in compress_stream(chunks(data), encoding, level, OFFLOAD_SIZE):
+        size += len(chunk)
+    return size
+
+
+async def measure(data: bytes, encoding: str, level: int) -> Tuple[int, int, float]:
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        compressed = compress_bytes(data, encoding, level)
+    elapsed = (time.perf_counter() - start) / RUNS
+    return len(compressed), await streamed_size(data, encoding, level), elapsed
+
+
+async def main() -> None:
+    print(
+        f"{'payload':>8} {'encoding':>8} {'level':>5} {'size':>9} {'compressed':>10} "
+        f"{'streamed':>9} {'saved':>6} {'time (ms)':>10}"
+    )
+    for name, data in payloads():
+        for encoding in RESPONSE_ENCODINGS:
+            for level in LEVELS:
+                compressed, streamed, elapsed = await measure(data, encoding, level)
+                saved = 1 - compressed / len(data)
+                print(
+                    f"{name:>8} {encoding:>8} {level:>5} {len(data):>9} "
+                    f"{compressed:>10} {streamed:>9} {saved:>6.1%} "
+                    f"{elapsed * 1e3:>10.2f}"
+                )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
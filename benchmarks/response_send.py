@@ -0,0 +1,73 @@
+"""
+Counts the ASGI send calls and body bytes copied per response by
+HTTPHandler.respond, next to the old pipeline that copied the body into 1024
+byte slices and finished with an empty message
+
+Usage: PYTHONPATH=. python benchmarks/response_send.py
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Tuple
+
+from tonberry import create_app
+from tonberry.contexted.response import Response
+from tonberry.handlers import HTTPHandler
+
+SIZES = (512, 64 * 1024, 1024 * 1024, 10 * 1024 * 1024)
+RUNS = 20
+
+
+class CountingSend:
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.calls = 0
+        self.copied = 0
+
+    async def __call__(self, message: Dict[str, Any]) -> None:
+        self.calls += 1
+        body = message.get("body")
+        # memoryview slices share the response's buffer, new bytes objects are copies
+        if isinstance(body, bytes) and body is not self.data:
+            self.copied += len(body)
+
+
+async def old_respond(send: CountingSend, response: Response) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    data = response.body.data
+    for position in range(0, len(data), 1024):
+        chunk = data[position : position + 1024]
+        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def measure(respond: Any, size: int) -> Tuple[int, int, float]:
+    response = Response()
+    # noinspection PyTypeHints
+    response.body = b"x" * size  # type: ignore
+    send = CountingSend(response.body.data)
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        await respond(send, response)
+    elapsed = (time.perf_counter() - start) / RUNS
+    return send.calls // RUNS, send.copied // RUNS, elapsed
+
+
+async def main() -> None:
+    app = create_app()
+    handler = HTTPHandler(app, {"type": "http"})
+    rows: List[str] = []
+    for size in SIZES:
+        for name, respond in (("old", old_respond), ("new", handler.respond)):
+            calls, copied, elapsed = await measure(respond, size)
+            rows.append(
+                f"{size:>10} {name:>4} {calls:>8} {copied:>14} {elapsed * 1e6:>12.1f}"
+            )
+    print(
+        f"{'body size':>10} {'':>4} {'sends':>8} {'bytes copied':>14} {'time (us)':>12}"
+    )
+    print("\n".join(rows))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
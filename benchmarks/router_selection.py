@@ -0,0 +1,78 @@
+"""
+Compares picking a router through the app's prefix index against trying every
+router in turn, the way requests were routed before the index existed
+
+The route cache is disabled so every lookup does the full selection.
+
+Usage: PYTHONPATH=. python benchmarks/router_selection.py [requests]
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional, Tuple
+
+from tonberry import create_app, expose
+from tonberry.app import App
+from tonberry.routers import Router
+
+
+class Root:
+    @expose.get
+    async def index(self) -> str:
+        return "index"
+
+    @expose.get
+    async def hello(self, name: str) -> str:
+        return f"Hello {name}"
+
+
+def linear_resolve(
+    app: App, http_method: str, path: str
+) -> Optional[Tuple[Router, Any]]:
+    for router in list(app.static_routes) + list(app.dynamic_routes):
+        match = router.resolve(http_method, path)
+        if match is not None:
+            return router, match
+    return None
+
+
+def make_app(mounts: int, static_root: Path) -> App:
+    app = create_app(Root)
+    app.route_cache.maxsize = 0
+    for mount in range(mounts):
+        mount_root = static_root / f"mount_{mount}"
+        mount_root.mkdir(exist_ok=True)
+        (mount_root / "app.css").write_text("body {}")
+        app.add_static_route(mount_root, f"/static_{mount}")
+    return app
+
+
+def throughput(
+    resolve: Callable[[str, str], Any], paths: Tuple[str, ...], requests: int
+) -> float:
+    start = time.perf_counter()
+    for num in range(requests):
+        resolve("GET", paths[num % len(paths)])
+    return requests / (time.perf_counter() - start)
+
+
+def main() -> None:
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    print(f"{'mounts':>6} {'linear (req/s)':>15} {'indexed (req/s)':>16} {'gain':>6}")
+    with tempfile.TemporaryDirectory() as static_dir:
+        for mounts in (1, 10, 25, 50):
+            app = make_app(mounts, Path(static_dir))
+            paths = ("/", "/hello/world", f"/static_{mounts - 1}/app.css")
+            linear = throughput(
+                lambda method, path: linear_resolve(app, method, path), paths, requests
+            )
+            indexed = throughput(app.resolve_route, paths, requests)
+            print(
+                f"{mounts:>6} {linear:>15.0f} {indexed:>16.0f} {indexed / linear:>5.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
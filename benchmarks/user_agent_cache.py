@@ -0,0 +1,63 @@
+"""
+Compares parsing the User-Agent header on every request with going through the
+process wide parse cache, using a few hundred distinct strings picked with a
+skew like real traffic where a handful of browsers make up most requests
+
+Usage: PYTHONPATH=. python benchmarks/user_agent_cache.py [requests] [distinct]
+"""
+
+import random
+import sys
+import time
+from typing import List
+
+import user_agents
+
+from tonberry.contexted.request import get_user_agent_cache, parse_user_agent
+
+TEMPLATES = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/{version}.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/{version}.0 Safari/605.1.15",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:{version}.0) Gecko/20100101 "
+    "Firefox/{version}.0",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/{version}.0 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/{version}.0.0.0 Mobile Safari/537.36",
+)
+
+
+def traffic(requests: int, distinct: int) -> List[str]:
+    strings = [
+        TEMPLATES[num % len(TEMPLATES)].format(version=60 + num // len(TEMPLATES))
+        for num in range(distinct)
+    ]
+    weights = [1 / (rank + 1) for rank in range(distinct)]
+    return random.Random(0).choices(strings, weights, k=requests)
+
+
+def main() -> None:
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    distinct = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    headers = traffic(requests, distinct)
+
+    start = time.perf_counter()
+    for header in headers:
+        user_agents.parse(header)
+    uncached = (time.perf_counter() - start) / requests
+
+    start = time.perf_counter()
+    for header in headers:
+        parse_user_agent(header)
+    cached = (time.perf_counter() - start) / requests
+
+    print(f"requests: {requests}, distinct user agents: {distinct}")
+    print(f"parse every request: {uncached * 1e6:8.1f} us")
+    print(f"parse cache:         {cached * 1e6:8.1f} us  {uncached / cached:.1f}x")
+    print(get_user_agent_cache().cache_info())
+
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,6 @@ setup(
     url="https://github.com/Ayehavgunne/Tonberry/",
     packages=find_packages(),
     install_requires=requirements,
-    extras_require={"dev": ["mypy", "black", "isort"]},
+    extras_require={"dev": ["mypy", "black", "isort"], "brotli": ["brotli"], "orjson": ["orjson"]},
     python_requires=">=3.7",
 )
@@ -0,0 +1,175 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Set, Tuple, Union
+
+import pytest
+
+from tonberry.binders import get_binder
+from tonberry.exceptions import BindError
+
+try:
+    from typing import Literal
+except ImportError:  # Python 3.7
+    Literal = None  # type: ignore
+
+
+@dataclass
+class Address:
+    street: str
+    zip_code: Optional[str]
+
+
+@dataclass
+class Person:
+    name: str
+    age: int
+    score: float = 0.0
+    address: Optional[Address] = None
+    tags: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Node:
+    value: int
+    children: List["Node"] = field(default_factory=list)
+
+
+@dataclass
+class Collections:
+    numbers: Set[int]
+    frozen: FrozenSet[str]
+    pair: Tuple[int, str]
+    many: Tuple[int, ...]
+    lookup: Dict[str, List[int]]
+    sequence: Sequence[int]
+    either: Union[int, str]
+    anything: Any
+
+
+def bind_error(data_class: type, data: Any) -> str:
+    with pytest.raises(BindError) as info:
+        get_binder(data_class)(data)
+    assert info.value.args[0] == 400
+    return str(info.value)
+
+
+def test_binds_nested_dataclasses() -> None:
+    person = get_binder(Person)(
+        {
+            "name": "Bob",
+            "age": 42,
+            "address": {"street": "Main", "zip_code": None},
+            "tags": ["a"],
+            "unknown": "ignored",
+        }
+    )
+    assert person == Person("Bob", 42, 0.0, Address("Main", None), ["a"])
+
+
+def test_defaults_and_missing_optionals() -> None:
+    assert get_binder(Person)({"name": "Bob", "age": 1}) == Person("Bob", 1)
+    assert get_binder(Address)({"street": "Main"}) == Address("Main", None)
+
+
+def test_ints_are_accepted_for_floats() -> None:
+    person = get_binder(Person)({"name": "Bob", "age": 1, "score": 3})
+    assert person.score == 3.0
+    assert isinstance(person.score, float)
+
+
+def test_self_referencing_dataclasses() -> None:
+    tree = get_binder(Node)({"value": 1, "children": [{"value": 2}]})
+    assert tree == Node(1, [Node(2)])
+    assert bind_error(Node, {"value": 1, "children": [{"value": "x"}]}) == (
+        "children.0.value: expected int, got str"
+    )
+
+
+def test_collections() -> None:
+    bound = get_binder(Collections)(
+        {
+            "numbers": [1, 2, 2],
+            "frozen": ["a"],
+            "pair": [1, "a"],
+            "many": [1, 2, 3],
+            "lookup": {"a": [1]},
+            "sequence": (1, 2),
+            "either": "x",
+            "anything": object,
+        }
+    )
+    assert bound.numbers == {1, 2}
+    assert bound.frozen == frozenset({"a"})
+    assert bound.pair == (1, "a")
+    assert bound.many == (1, 2, 3)
+    assert bound.lookup == {"a": [1]}
+    assert bound.sequence == [1, 2]
+    assert bound.either == "x"
+    assert bound.anything is object
+
+
+@pytest.mark.parametrize(
+    "data, message",
+    [
+        ({"name": "Bob"}, "age: missing value"),
+        ({"name": "Bob", "age": "42"}, "age: expected int, got str"),
+        ({"name": "Bob", "age": 1, "score": "1"}, "score: expected float, got str"),
+        ({"name": "Bob", "age": 1, "tags": "abc"}, "tags: expected list, got str"),
+        ({"name": "Bob", "age": 1, "tags": ["a", 2]}, "tags.1: expected str, got int"),
+        (
+            {"name": "Bob", "age": 1, "address": {"zip_code": "1"}},
+            "address.street: missing value",
+        ),
+        (
+            {"name": "Bob", "age": 1, "address": "Main"},
+            "address: expected an object for Address, got str",
+        ),
+        (["Bob", 42], "expected an object for Person, got list"),
+    ],
+)
+def test_person_errors(data: Any, message: str) -> None:
+    assert bind_error(Person, data) == message
+
+
+def test_collection_errors() -> None:
+    valid = {
+        "numbers": [1],
+        "frozen": [],
+        "pair": [1, "a"],
+        "many": [],
+        "lookup": {},
+        "sequence": [],
+        "either": 1,
+        "anything": None,
+    }
+    cases = {
+        "pair": ([1, "a", 2], "pair: expected 2 items, got 3"),
+        "many": ([1, "2"], "many.1: expected int, got str"),
+        "lookup": ({"a": ["x"]}, "lookup.a.0: expected int, got str"),
+        "either": (1.5, "either: expected int or str, got float"),
+        "numbers": ({"a": 1}, "numbers: expected set, got dict"),
+    }
+    for name, (value, message) in cases.items():
+        assert bind_error(Collections, {**valid, name: value}) == message
+
+
+@pytest.mark.skipif(Literal is None, reason="typing.Literal needs Python 3.8")
+def test_literals() -> None:
+    @dataclass
+    class Order:
+        side: Literal["buy", "sell"]  # type: ignore
+
+    assert get_binder(Order)({"side": "buy"}) == Order("buy")
+    assert bind_error(Order, {"side": "hold"}) == (
+        "side: expected one of ('buy', 'sell'), got 'hold'"
+    )
+
+
+def test_binders_are_cached() -> None:
+    assert get_binder(Person) is get_binder(Person)
+    assert get_binder(Person).field_names == {
+        "name",
+        "age",
+        "score",
+        "address",
+        "tags",
+    }
@@ -0,0 +1,114 @@
+import time
+
+import pytest
+
+from tonberry.cookie_sessions import SessionSigner, _b64decode, _b64encode
+
+
+def test_round_trip() -> None:
+    signer = SessionSigner(["secret"])
+    data = {"user": "bob", "cart": [1, 2], "name": "naïve"}
+    assert signer.loads(signer.dumps(data)) == (data, False)
+
+
+def test_large_values_are_compressed() -> None:
+    signer = SessionSigner(["secret"])
+    data = {"history": ["/products/1"] * 200}
+    value = signer.dumps(data)
+    assert value.startswith("z")
+    assert len(value) < len(str(data))
+    assert signer.loads(value) == (data, False)
+
+
+def test_small_values_are_not_compressed() -> None:
+    assert SessionSigner(["secret"]).dumps({"a": 1}).startswith("j")
+
+
+def test_tampered_values_are_rejected() -> None:
+    signer = SessionSigner(["secret"])
+    value = signer.dumps({"role": "user"})
+    message, _, signature = value.rpartition(".")
+    payload, _, timestamp = message.rpartition(".")
+    forged = _b64encode(b'{"role":"admin"}')
+    assert signer.loads(f"j{forged}.{timestamp}.{signature}") == (None, False)
+    assert signer.loads(f"{payload}.{int(timestamp) + 1}.{signature}") == (
+        None,
+        False,
+    )
+    assert signer.loads(f"{message}.{signature[:-2]}") == (None, False)
+
+
+@pytest.mark.parametrize("value", ["", ".", "..", "garbage", "j.1.x", "a.b.c.d"])
+def test_garbage_is_rejected(value: str) -> None:
+    assert SessionSigner(["secret"]).loads(value) == (None, False)
+
+
+def test_other_secrets_are_rejected() -> None:
+    value = SessionSigner(["other"]).dumps({"a": 1})
+    assert SessionSigner(["secret"]).loads(value) == (None, False)
+
+
+def test_old_secrets_are_accepted_and_resigned() -> None:
+    value = SessionSigner(["old"]).dumps({"a": 1})
+    assert SessionSigner(["new", "old"]).loads(value) == ({"a": 1}, True)
+
+
+def test_expired_values_are_rejected(monkeypatch: pytest.MonkeyPatch) -> None:
+    signer = SessionSigner(["secret"], max_age=100)
+    value = signer.dumps({"a": 1})
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 60)
+    assert signer.loads(value) == ({"a": 1}, True)
+    monkeypatch.setattr(time, "time", lambda: now + 101)
+    assert signer.loads(value) == (None, False)
+
+
+def test_oversized_values() -> None:
+    signer = SessionSigner(["secret"], max_size=200)
+    with pytest.raises(ValueError):
+        signer.dumps({"data": [str(num) for num in range(200)]})
+    assert signer.loads("j" + "a" * 300) == (None, False)
+
+
+def test_decompression_is_bounded() -> None:
+    big = SessionSigner(["secret"], max_size=100000)
+    value = big.dumps({"a": "x" * 200000})
+    assert len(value) < 4000
+    assert SessionSigner(["secret"]).loads(value) == (None, False)
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        f"j{_b64encode(b'[1, 2]')}.1",
+        f"j{_b64encode(b'{not json')}.1",
+        f"z{_b64encode(b'not zlib')}.1",
+        "j!!!.1",
+        f"j{_b64encode(b'{}')}.yesterday",
+    ],
+)
+def test_signed_but_invalid_payloads_are_rejected(message: str) -> None:
+    signer = SessionSigner(["secret"])
+    value = f"{message}.{signer._sign(signer.keys[0], message)}"
+    assert signer.loads(value) == (None, False)
+
+
+def test_digest_follows_the_data() -> None:
+    signer = SessionSigner(["secret"])
+    data = {"cart": ["a"]}
+    digest = signer.digest(data)
+    data["cart"].append("b")
+    assert signer.digest(data) != digest
+    assert signer.digest({"cart": ["a"]}) == digest
+
+
+def test_needs_a_secret() -> None:
+    with pytest.raises(ValueError):
+        SessionSigner([])
+
+
+def test_base64_without_padding() -> None:
+    for size in range(5):
+        data = bytes(range(size))
+        assert "=" not in _b64encode(data)
+        assert _b64decode(_b64encode(data)) == data
@@ -0,0 +1,159 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List
+
+import pytest
+
+from tonberry.exceptions import HTTPError
+from tonberry.multipart import MultipartParser, UploadFile, parse_options
+
+BOUNDARY = b"----boundary42"
+
+
+def build_body(*parts: bytes) -> bytes:
+    body = b"preamble to skip\r\n"
+    for part in parts:
+        body += b"--" + BOUNDARY + b"\r\n" + part + b"\r\n"
+    return body + b"--" + BOUNDARY + b"--\r\nepilogue"
+
+
+def field(name: str, value: bytes) -> bytes:
+    return f'Content-Disposition: form-data; name="{name}"\r\n\r\n'.encode() + value
+
+
+def upload(name: str, filename: str, value: bytes) -> bytes:
+    return (
+        f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+        f"Content-Type: text/plain\r\n\r\n"
+    ).encode() + value
+
+
+async def chunked(body: bytes, size: int) -> AsyncIterator[bytes]:
+    for start in range(0, len(body), size):
+        yield body[start : start + size]
+
+
+def parse(body: bytes, chunk_size: int = 65536, **kwargs: Any) -> Dict[str, Any]:
+    parser = MultipartParser(BOUNDARY, **kwargs)
+    return asyncio.run(parser.parse(chunked(body, chunk_size)))
+
+
+def read(file: UploadFile) -> bytes:
+    async def read_all() -> bytes:
+        await file.seek(0)
+        return await file.read()
+
+    return asyncio.run(read_all())
+
+
+def test_fields_and_files() -> None:
+    form = parse(
+        build_body(field("title", "héllo".encode()), upload("doc", "a.txt", b"data"))
+    )
+    assert form["title"] == "héllo"
+    assert isinstance(form["doc"], UploadFile)
+    assert form["doc"].filename == "a.txt"
+    assert form["doc"].content_type == "text/plain"
+    assert read(form["doc"]) == b"data"
+
+
+def test_repeated_names_become_lists() -> None:
+    form = parse(build_body(field("tag", b"a"), field("tag", b"b"), field("x", b"")))
+    assert form == {"tag": ["a", "b"], "x": ""}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 13, len(BOUNDARY) + 4])
+def test_boundaries_split_across_chunks(chunk_size: int) -> None:
+    # Values that look like the start of a delimiter must survive as data
+    tricky = b"\r\n--" + BOUNDARY[:-1] + b"\r\n-"
+    form = parse(
+        build_body(field("a", b"first"), upload("f", "t.bin", tricky), field("b", b"")),
+        chunk_size,
+    )
+    assert form["a"] == "first"
+    assert read(form["f"]) == tricky
+    assert form["b"] == ""
+
+
+def test_uploads_spool_to_disk() -> None:
+    data = bytes(range(256)) * 64
+    form = parse(build_body(upload("f", "big.bin", data)), 1000, spool_size=4096)
+    assert not form["f"].in_memory
+    assert form["f"].size == len(data)
+    assert read(form["f"]) == data
+
+
+def test_memory_limit_rolls_uploads_over() -> None:
+    parser = MultipartParser(BOUNDARY, spool_size=10000, memory_limit=3000)
+    body = build_body(
+        upload("a", "a.bin", b"a" * 2000), upload("b", "b.bin", b"b" * 2000)
+    )
+    form = asyncio.run(parser.parse(chunked(body, 500)))
+    assert parser.memory_used <= 3000
+    assert form["a"].in_memory
+    assert not form["b"].in_memory
+    assert read(form["a"]) == b"a" * 2000
+    assert read(form["b"]) == b"b" * 2000
+
+
+def expect_error(code: int, body: bytes, **kwargs: Any) -> None:
+    with pytest.raises(HTTPError) as info:
+        parse(body, 100, **kwargs)
+    assert info.value.args[0] == code
+
+
+def test_incomplete_body() -> None:
+    body = build_body(field("a", b"value"))
+    expect_error(400, body[: body.rindex(b"--" + BOUNDARY)])
+
+
+def test_part_without_name() -> None:
+    expect_error(400, build_body(b"Content-Disposition: form-data\r\n\r\nx"))
+
+
+def test_field_that_is_not_utf8() -> None:
+    expect_error(400, build_body(field("a", b"\xff\xfe")))
+
+
+def test_oversized_headers() -> None:
+    expect_error(400, build_body(b"X-Filler: " + b"x" * 20000 + b"\r\n\r\n"))
+
+
+def test_field_size_limit() -> None:
+    expect_error(413, build_body(field("a", b"x" * 101)), max_field_size=100)
+
+
+def test_fields_share_the_memory_limit() -> None:
+    parts: List[bytes] = [field(f"f{num}", b"x" * 60) for num in range(5)]
+    expect_error(413, build_body(*parts), memory_limit=250)
+
+
+def test_field_count_limit() -> None:
+    parts = [field(f"f{num}", b"x") for num in range(4)]
+    expect_error(413, build_body(*parts), max_fields=3)
+    assert parse(build_body(*parts[:3]), max_fields=3)
+
+
+def test_file_count_limit() -> None:
+    parts = [upload("f", f"{num}.txt", b"x") for num in range(4)]
+    expect_error(413, build_body(*parts), max_files=3)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ('form-data; name="upload"', ("form-data", {"name": "upload"})),
+        (
+            'Form-Data; name="a;b"; filename="c \\"d\\".txt"',
+            ("form-data", {"name": "a;b", "filename": 'c "d".txt'}),
+        ),
+        ("form-data; name=plain", ("form-data", {"name": "plain"})),
+        (
+            "form-data; filename=\"fallback.txt\"; filename*=UTF-8''na%C3%AFve.txt",
+            ("form-data", {"filename": "naïve.txt"}),
+        ),
+        ('form-data; name="first"; name="second"', ("form-data", {"name": "first"})),
+        ("", ("", {})),
+    ],
+)
+def test_parse_options(value: str, expected: tuple) -> None:
+    assert parse_options(value) == expected
@@ -0,0 +1,76 @@
+import pytest
+
+from tonberry.contexted.response import Response
+from tonberry.ranges import if_range_matches, parse_range
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-99", [(0, 100)]),
+        ("bytes=0-0", [(0, 1)]),
+        ("bytes=500-", [(500, 1000)]),
+        ("bytes=-50", [(950, 1000)]),
+        ("bytes=0-99, -50", [(0, 100), (950, 1000)]),
+        ("BYTES = 10-19", [(10, 20)]),
+        ("bytes=900-5000", [(900, 1000)]),
+        ("bytes=-5000", [(0, 1000)]),
+        ("bytes=0-1,,5-6", [(0, 2), (5, 7)]),
+    ],
+)
+def test_satisfiable_ranges(header: str, expected: list) -> None:
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize(
+    "header", ["bytes=1000-", "bytes=1000-1999", "bytes=-0", "bytes=5000-, -0"]
+)
+def test_unsatisfiable_ranges(header: str) -> None:
+    assert parse_range(header, 1000) == []
+
+
+def test_unsatisfiable_ranges_are_dropped_from_a_set() -> None:
+    assert parse_range("bytes=2000-, 0-9", 1000) == [(0, 10)]
+
+
+def test_empty_resource() -> None:
+    assert parse_range("bytes=-10", 0) == []
+    assert parse_range("bytes=0-", 0) == []
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        "items=0-9",
+        "0-9",
+        "bytes=",
+        "bytes=,,",
+        "bytes=-",
+        "bytes=5",
+        "bytes=9-5",
+        "bytes=abc",
+        "bytes=0-1, x",
+        "bytes=+5-9",
+        "bytes=1_0-20",
+        "bytes=5 - 9",
+        "bytes=--5",
+        "bytes=٣-5",
+    ],
+)
+def test_malformed_ranges(header: str) -> None:
+    assert parse_range(header, 1000) is None
+
+
+def test_if_range_needs_a_strong_etag_match() -> None:
+    response = Response()
+    response.headers["ETag"] = '"abc"'
+    assert if_range_matches('"abc"', response)
+    assert not if_range_matches('"abd"', response)
+    assert not if_range_matches('W/"abc"', response)
+
+
+def test_if_range_compares_dates_exactly() -> None:
+    response = Response()
+    response.headers["Last-Modified"] = "Sun, 18 Oct 2026 11:21:13 GMT"
+    assert if_range_matches("Sun, 18 Oct 2026 11:21:13 GMT", response)
+    assert not if_range_matches("Sun, 18 Oct 2026 11:21:14 GMT", response)
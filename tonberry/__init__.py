@@ -7,12 +7,14 @@ from tonberry.contexted.request import Request
 from tonberry.contexted.response import Response
 from tonberry.contexted.session import Session
 from tonberry.expose import _Expose
+from tonberry.multipart import UploadFile
 from tonberry.util import File, Jinja
 from tonberry.websocket import WebSocket
 
 if TYPE_CHECKING:
     from tonberry.app import App
     from tonberry.routers import Router
+    from tonberry.session_backends import SessionBackend
 
 expose = _Expose
 
@@ -25,13 +27,17 @@ session: Session = ContextVarManager("session")  # type: ignore
 # noinspection PyTypeChecker
 websocket: WebSocket = ContextVarManager("websocket")  # type: ignore
 config = config_init()
-jinja = Jinja(Path(config.JINJA_TEMPLATE_PATH))
+jinja = Jinja(
+    Path(config.JINJA_TEMPLATE_PATH),
+    bytecode_cache_dir=config.JINJA_BYTECODE_CACHE_DIR,
+    enable_async=config.JINJA_ENABLE_ASYNC,
+)
 
 
-def create_app(root: Type = None) -> "App":
+def create_app(root: Type = None, session_backend: "SessionBackend" = None) -> "App":
     from tonberry.app import App
 
-    app_instance = App()
+    app_instance = App(session_backend=session_backend)
     if root is not None:
         app_instance.routers[0].root = root()  # type: ignore
     return app_instance
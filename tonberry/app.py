@@ -1,5 +1,16 @@
+import time
 from pathlib import Path
-from typing import Callable, Generator, List, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 from uuid import UUID, uuid4
 
 from tonberry import config
@@ -11,9 +22,9 @@ from tonberry.context_var_manager import set_context_var
 from tonberry.contexted.request import Request
 from tonberry.contexted.response import Response
 from tonberry.contexted.session import Session, SessionStore
+from tonberry.cookie_sessions import SessionSigner
 from tonberry.exceptions import (
     HTTPError,
-    RouteNotFoundError,
     WebSocketDisconnect,
     WebSocketDisconnectError,
     WebSocketError,
@@ -25,20 +36,59 @@ from tonberry.loggers import (
     create_websocket_access_logger,
 )
 from tonberry.models import Receive, Scope, Send
+from tonberry.ranges import apply_range
 from tonberry.routers import DynamicRouter, MethodRouter, Router, StaticRouter
+from tonberry.session_backends import SessionBackend, SQLiteSessionBackend
+from tonberry.util import LRUCache, shutdown_executor
 from tonberry.websocket import WebSocket
 
 
 class App:
-    def __init__(self, routers: List[Router] = None):
+    def __init__(
+        self, routers: List[Router] = None, session_backend: SessionBackend = None
+    ):
         self.config = config
-        self.routers = routers or [MethodRouter(self)]
+        self.route_cache = LRUCache(self.config.ROUTE_CACHE_SIZE)
+        # Misses get their own cache so a flood of unknown paths can't push the
+        # hot routes out
+        self.route_miss_cache = LRUCache(self.config.ROUTE_MISS_CACHE_SIZE)
+        self.static_cache = LRUCache(
+            maxsize=self.config.STATIC_CACHE_SIZE,
+            maxbytes=self.config.STATIC_CACHE_MAX_BYTES,
+        )
+        # Files found missing, like precompressed copies that were never made,
+        # kept apart so they don't take slots from cached contents
+        self.static_miss_cache = LRUCache(self.config.STATIC_MISS_CACHE_SIZE)
+        self.routers: List[Router] = []
+        self._static_index: Dict[Tuple[str, ...], List[StaticRouter]] = {}
+        self._longest_prefix = 0
+        self._dynamic_routers: List[DynamicRouter] = []
+        for router in routers or [MethodRouter(self)]:
+            self.add_router(router)
         self.http_access_logger = create_http_access_logger(self.config.LOG_LEVEL)
         self.websocket_access_logger = create_websocket_access_logger(
             self.config.LOG_LEVEL
         )
         self.app_logger = create_app_logger(self.config.LOG_LEVEL)
-        self.sessions = SessionStore()
+        self.sessions = SessionStore(
+            maxsize=self.config.SESSION_MAX_ENTRIES,
+            ttl=self.config.SESSION_IDLE_TTL,
+        )
+        if session_backend is None and self.config.SESSION_DB_PATH:
+            session_backend = SQLiteSessionBackend(
+                self.config.SESSION_DB_PATH,
+                ttl=self.config.SESSION_IDLE_TTL,
+                flush_interval=self.config.SESSION_FLUSH_INTERVAL,
+                batch_size=self.config.SESSION_FLUSH_BATCH_SIZE,
+            )
+        self.session_backend = session_backend
+        self.session_signer: Optional[SessionSigner] = None
+        if self.config.SESSION_COOKIE_SECRETS:
+            self.session_signer = SessionSigner(
+                self.config.SESSION_COOKIE_SECRETS,
+                max_size=self.config.SESSION_COOKIE_MAX_SIZE,
+                max_age=self.config.SESSION_IDLE_TTL,
+            )
         self.startup_functions: List[Callable] = []
         self.shutdown_functions: List[Callable] = []
 
@@ -66,6 +116,16 @@ class App:
 
     def add_router(self, router: Router) -> None:
         self.routers.append(router)
+        if isinstance(router, StaticRouter):
+            self._static_index.setdefault(router.prefix, []).append(router)
+            self._longest_prefix = max(self._longest_prefix, len(router.prefix))
+        elif isinstance(router, DynamicRouter):
+            self._dynamic_routers.append(router)
+        self.clear_route_cache()
+
+    def clear_route_cache(self) -> None:
+        self.route_cache.clear()
+        self.route_miss_cache.clear()
 
     def add_static_route(self, path_root: Union[str, Path], route: str = "") -> None:
         self.add_router(StaticRouter(self, path_root, route))
@@ -76,33 +136,75 @@ class App:
     def on_shutdown(self, func: Callable) -> None:
         self.shutdown_functions.append(func)
 
-    def startup(self) -> None:
+    async def startup(self) -> None:
+        if self.config.JINJA_PRECOMPILE:
+            from tonberry import jinja
+
+            jinja.precompile()
+        if self.session_backend is not None:
+            await self.session_backend.open()
+            snapshot_path = Path(self.config.SESSION_SNAPSHOT_PATH)
+            if self.config.SESSION_SNAPSHOT_PATH and snapshot_path.is_file():
+                await self.session_backend.restore(snapshot_path)
         for func in self.startup_functions:
             func()
 
-    def shutdown(self) -> None:
+    async def shutdown(self) -> None:
         for func in self.shutdown_functions:
             func()
+        if self.session_backend is not None:
+            if self.config.SESSION_SNAPSHOT_PATH:
+                await self.session_backend.snapshot(
+                    Path(self.config.SESSION_SNAPSHOT_PATH)
+                )
+            await self.session_backend.close()
+        shutdown_executor()
+
+    def select_routers(self, path: str) -> Iterator[Router]:
+        """
+        Yields the static routers mounted on a prefix of the path, longest prefix
+        first, followed by the dynamic routers
+        """
+        segments = tuple(segment for segment in path.split("/") if segment)
+        for length in range(min(len(segments), self._longest_prefix), -1, -1):
+            yield from self._static_index.get(segments[:length], ())
+        yield from self._dynamic_routers
+
+    def resolve_route(
+        self, http_method: str, path: str
+    ) -> Optional[Tuple[Router, Any]]:
+        key = (http_method, path)
+        resolved = self.route_cache.get(key)
+        if resolved is not None:
+            return resolved
+        if self.route_miss_cache.get(key):
+            return None
+        for router in self.select_routers(path):
+            match = router.resolve(http_method, path)
+            if match is not None:
+                self.route_cache.set(key, (router, match))
+                return router, match
+        self.route_miss_cache.set(key, True, ttl=self.config.ROUTE_CACHE_MISS_TTL)
+        return None
 
     async def handle_request(self, request: Request) -> Response:
         set_context_var(request_context, request)
         response = Response()
         set_context_var(response_context, response)
-        for s_router in self.static_routes:
-            try:
-                response = await s_router.handle_request(request, response)
-                break
-            except RouteNotFoundError:
-                pass
-        else:  # no break
-            for d_router in self.dynamic_routes:
-                try:
-                    response = await d_router.handle_request(request, response)
-                    break
-                except RouteNotFoundError:
-                    pass
-            else:  # no break
-                raise HTTPError(404)
+        resolved = self.resolve_route(request.method, request.path)
+        if resolved is None:
+            raise HTTPError(404)
+        router, match = resolved
+        handled = await router.handle_request(request, response, match)
+        if handled is None:
+            # Only forget the route if it no longer resolves, a handler can turn
+            # down a request for other reasons, like an unexpected argument
+            if router.resolve(request.method, request.path) is None:
+                self.route_cache.pop((request.method, request.path))
+            raise HTTPError(404)
+        response = handled
+        # Before logging, so 206 and 416 responses are logged with their status
+        await apply_range(request, response)
         if self.config.ACCESS_LOGGING:
             self.http_access_logger.info()
         return response
@@ -110,35 +212,119 @@ class App:
     async def handle_ws_request(self, websocket: WebSocket, request: Request) -> None:
         set_context_var(request_context, request)
         set_context_var(websocket_context, websocket)
-        for router in self.dynamic_routes:
+        for router in self._dynamic_routers:
+            handled = await router.handle_ws_request(request)
+            if handled is None:
+                continue
+            func, args = handled
+            await websocket.accept()
+            self.websocket_access_logger.info("Opened")
             try:
-                func, args = await router.handle_ws_request(request)
-                await websocket.accept()
-                self.websocket_access_logger.info("Opened")
-                try:
-                    await func(*args)
-                except WebSocketDisconnect:
-                    self.websocket_access_logger.info("Disconnected")
-                except WebSocketDisconnectError:
-                    self.websocket_access_logger.error("Disconnected unexpectedly")
-                break
-            except RouteNotFoundError:
-                pass
+                await func(*args)
+            except WebSocketDisconnect:
+                self.websocket_access_logger.info("Disconnected")
+            except WebSocketDisconnectError:
+                self.websocket_access_logger.error("Disconnected unexpectedly")
+            break
         else:  # no break
             raise WebSocketError
 
-    def get_session_id(self, request: Request) -> UUID:
-        sesson_cookie = request.headers.get_cookie("TBSESSIONID")
-        if sesson_cookie is not None:
-            session_id = UUID(str(sesson_cookie))
-            session = self.sessions[session_id]
-            set_context_var(session_context, session)
-            return session_id
-        else:
-            return self.create_session()
+    async def get_session(self, request: Request) -> Session:
+        """
+        Finds the session named by the request's cookie, or starts an unsaved one
+        that is only stored if the handler writes to it
+
+        With a session backend, sessions held locally for longer than
+        SESSION_CACHE_TTL are loaded again to pick up changes from other workers.
+        """
+        if self.session_signer is not None:
+            return self._get_cookie_session(request, self.session_signer)
+        session = None
+        session_id = None
+        session_cookie = request.headers.get_cookie("TBSESSIONID")
+        if session_cookie is not None:
+            try:
+                session_id = UUID(str(session_cookie))
+            except ValueError:
+                pass
+        if session_id is not None:
+            session = self.sessions.get(session_id)
+            backend = self.session_backend
+            if backend is not None and (
+                session is None
+                or time.monotonic() - session.loaded_at > self.config.SESSION_CACHE_TTL
+            ):
+                data = await backend.load(session_id)
+                if data is None:
+                    session = None
+                    self.sessions.pop(session_id)
+                else:
+                    session = Session(session_id, data)
+                    session.digest = backend.digest(data)
+                    self.sessions[session_id] = session
+        if session is None:
+            session = Session()
+        set_context_var(session_context, session)
+        return session
 
-    def create_session(self) -> UUID:
-        new_session_id = uuid4()
-        self.sessions[new_session_id] = Session(new_session_id)
-        set_context_var(session_context, self.sessions[new_session_id])
-        return new_session_id
+    async def save_session(self, session: Session, response: Response) -> None:
+        """
+        Stores a new session that was written to and sends its cookie, changes
+        to existing sessions are passed on to the session backend
+        """
+        if self.session_signer is not None:
+            self._save_cookie_session(session, response, self.session_signer)
+            return
+        if session.session_id is None:
+            if not session.modified:
+                return
+            session.session_id = uuid4()
+            self.sessions[session.session_id] = session
+            response.headers.set_cookie(
+                "TBSESSIONID", str(session.session_id), path="/"
+            )
+        backend = self.session_backend
+        if backend is not None:
+            # Changes made in place, like session["cart"].append(item), don't set
+            # modified, so the data is compared with what was loaded as well
+            digest = backend.digest(session.data)
+            if session.modified or digest != session.digest:
+                await backend.save(session.session_id, session.data)
+                session.digest = digest
+            else:
+                await backend.touch(session.session_id)
+        session.modified = False
+
+    def _get_cookie_session(self, request: Request, signer: SessionSigner) -> Session:
+        session = Session()
+        session_cookie = request.headers.get_cookie("TBSESSION")
+        if session_cookie is not None:
+            data, resign = signer.loads(str(session_cookie))
+            if data is not None:
+                session.data = data
+                # Marked as changed so the cookie gets signed again on the way out
+                session.modified = resign
+        session.digest = signer.digest(session.data)
+        set_context_var(session_context, session)
+        return session
+
+    def _save_cookie_session(
+        self, session: Session, response: Response, signer: SessionSigner
+    ) -> None:
+        # Changes made in place don't set modified, the data is compared with
+        # what the cookie held as well
+        digest = signer.digest(session.data)
+        if not session.modified and digest == session.digest:
+            return
+        session.digest = digest
+        if session.data:
+            response.headers.set_cookie(
+                "TBSESSION",
+                signer.dumps(session.data),
+                path="/",
+                max_age=int(self.config.SESSION_IDLE_TTL),
+                httponly=True,
+            )
+        else:
+            response.headers.set_cookie("TBSESSION", "", path="/", max_age=0)
+        session.modified = False
@@ -0,0 +1,268 @@
+import collections.abc
+import types
+import typing
+from collections.abc import Mapping
+from dataclasses import MISSING, fields, is_dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from tonberry.exceptions import BindError
+
+Converter = Callable[[Any], Any]
+
+_binders: Dict[Type, "DataClassBinder"] = {}
+_UnionType = getattr(types, "UnionType", None)
+_Literal = getattr(typing, "Literal", None)
+_SET_ORIGINS = (collections.abc.Set, collections.abc.MutableSet)
+_SEQUENCE_ORIGINS = (
+    collections.abc.Sequence,
+    collections.abc.MutableSequence,
+    collections.abc.Collection,
+    collections.abc.Iterable,
+)
+
+
+def get_binder(data_class: Type) -> "DataClassBinder":
+    """
+    Returns the cached binder for a dataclass, compiling it the first time
+    """
+    binder = _binders.get(data_class)
+    if binder is None:
+        binder = DataClassBinder(data_class)
+        _binders[data_class] = binder
+        binder.compile()
+    return binder
+
+
+class DataClassBinder:
+    """
+    Builds a dataclass instance from a mapping, checking values against the
+    field type hints along the way
+
+    All the type hint introspection happens once in compile so binding a
+    request is only isinstance checks and dict lookups. Unknown keys are ignored.
+    """
+
+    def __init__(self, data_class: Type) -> None:
+        self.data_class = data_class
+        self.field_names: typing.FrozenSet[str] = frozenset()
+        self._fields: Tuple[Tuple[str, Optional[Converter], bool, bool], ...] = ()
+
+    def compile(self) -> None:
+        type_hints = typing.get_type_hints(self.data_class)
+        compiled = []
+        for data_field in fields(self.data_class):
+            if not data_field.init:
+                continue
+            field_type = type_hints.get(data_field.name, Any)
+            has_default = (
+                data_field.default is not MISSING
+                or data_field.default_factory is not MISSING  # type: ignore
+            )
+            compiled.append(
+                (
+                    data_field.name,
+                    compile_converter(field_type),
+                    has_default,
+                    _is_optional(field_type),
+                )
+            )
+        self._fields = tuple(compiled)
+        self.field_names = frozenset(name for name, *_ in compiled)
+
+    def __call__(self, data: Any) -> Any:
+        if not isinstance(data, Mapping):
+            raise BindError(
+                f"expected an object for {self.data_class.__name__}, "
+                f"got {type(data).__name__}"
+            )
+        kwargs = {}
+        for name, converter, has_default, optional in self._fields:
+            if name in data:
+                value = data[name]
+                if converter is not None:
+                    try:
+                        value = converter(value)
+                    except BindError as err:
+                        err.path.insert(0, name)
+                        raise
+                kwargs[name] = value
+            elif optional and not has_default:
+                kwargs[name] = None
+            elif not has_default:
+                raise BindError("missing value", [name])
+        return self.data_class(**kwargs)
+
+
+def _is_optional(field_type: Any) -> bool:
+    return _is_union(field_type) and type(None) in field_type.__args__
+
+
+def _is_union(field_type: Any) -> bool:
+    if _UnionType is not None and isinstance(field_type, _UnionType):
+        return True
+    return getattr(field_type, "__origin__", None) is typing.Union
+
+
+def _type_name(field_type: Any) -> str:
+    return getattr(field_type, "__name__", None) or str(field_type)
+
+
+def _wrong_type(value: Any, field_type: Any) -> BindError:
+    return BindError(f"expected {_type_name(field_type)}, got {type(value).__name__}")
+
+
+def compile_converter(field_type: Any) -> Optional[Converter]:
+    """
+    Returns a function that checks and converts a value for the type hint or
+    None if any value is accepted as is
+    """
+    if field_type is Any or isinstance(field_type, (typing.TypeVar, str)):
+        return None
+    if is_dataclass(field_type) and isinstance(field_type, type):
+        return get_binder(field_type)
+    if _is_union(field_type):
+        return _union_converter(field_type.__args__)
+    origin = getattr(field_type, "__origin__", None)
+    args = getattr(field_type, "__args__", None) or ()
+    if _Literal is not None and origin is _Literal:
+        return _literal_converter(args)
+    if origin is not None:
+        if origin is tuple:
+            return _tuple_converter(args)
+        if isinstance(origin, type) and issubclass(origin, Mapping):
+            return _mapping_converter(origin, args)
+        if origin in (list, set, frozenset):
+            return _collection_converter(origin, args)
+        if origin in _SET_ORIGINS:
+            return _collection_converter(set, args)
+        if origin in _SEQUENCE_ORIGINS:
+            return _collection_converter(list, args)
+        return None
+    if field_type is float:
+        return _float_converter
+    if isinstance(field_type, type):
+        return _instance_converter(field_type)
+    return None
+
+
+def _instance_converter(expected: Type) -> Converter:
+    def convert(value: Any) -> Any:
+        if isinstance(value, expected):
+            return value
+        raise _wrong_type(value, expected)
+
+    return convert
+
+
+def _float_converter(value: Any) -> Any:
+    if isinstance(value, float):
+        return value
+    # JSON has no separate integers, 3 is as good a float as 3.0
+    if isinstance(value, int):
+        return float(value)
+    raise _wrong_type(value, float)
+
+
+def _union_converter(args: Tuple[Any, ...]) -> Converter:
+    accepts_none = type(None) in args
+    converters = [compile_converter(arg) for arg in args if arg is not type(None)]
+    if any(converter is None for converter in converters):
+        return lambda value: value
+    if len(converters) == 1:
+        # Optional[X], whose errors can say exactly what was wrong inside X
+        only: Converter = converters[0]  # type: ignore
+        return lambda value: None if value is None and accepts_none else only(value)
+    union_name = " or ".join(_type_name(arg) for arg in args)
+
+    def convert(value: Any) -> Any:
+        if value is None and accepts_none:
+            return None
+        for converter in converters:
+            try:
+                return converter(value)  # type: ignore
+            except BindError:
+                pass
+        raise _wrong_type(value, union_name)
+
+    return convert
+
+
+def _literal_converter(args: Tuple[Any, ...]) -> Converter:
+    def convert(value: Any) -> Any:
+        if value in args:
+            return value
+        raise BindError(f"expected one of {args!r}, got {value!r}")
+
+    return convert
+
+
+def _collection_converter(build: Type, args: Tuple[Any, ...]) -> Converter:
+    item_converter = compile_converter(args[0]) if args else None
+
+    def convert(value: Any) -> Any:
+        if not isinstance(value, (list, tuple, set, frozenset)):
+            raise _wrong_type(value, build)
+        if item_converter is None:
+            return value if type(value) is build else build(value)
+        items: List[Any] = []
+        for index, item in enumerate(value):
+            try:
+                items.append(item_converter(item))
+            except BindError as err:
+                err.path.insert(0, str(index))
+                raise
+        return items if build is list else build(items)
+
+    return convert
+
+
+def _tuple_converter(args: Tuple[Any, ...]) -> Converter:
+    if len(args) == 2 and args[1] is Ellipsis:
+        return _collection_converter(tuple, args[:1])
+    item_converters = [compile_converter(arg) for arg in args]
+
+    def convert(value: Any) -> Any:
+        if not isinstance(value, (list, tuple)):
+            raise _wrong_type(value, tuple)
+        if not item_converters:
+            return tuple(value)
+        if len(value) != len(item_converters):
+            raise BindError(f"expected {len(item_converters)} items, got {len(value)}")
+        items = []
+        for index, (item, item_converter) in enumerate(zip(value, item_converters)):
+            if item_converter is None:
+                items.append(item)
+                continue
+            try:
+                items.append(item_converter(item))
+            except BindError as err:
+                err.path.insert(0, str(index))
+                raise
+        return tuple(items)
+
+    return convert
+
+
+def _mapping_converter(origin: Type, args: Tuple[Any, ...]) -> Converter:
+    key_converter = compile_converter(args[0]) if args else None
+    value_converter = compile_converter(args[1]) if len(args) > 1 else None
+
+    def convert(value: Any) -> Any:
+        if not isinstance(value, Mapping):
+            raise _wrong_type(value, origin)
+        if key_converter is None and value_converter is None:
+            return dict(value)
+        converted = {}
+        for key, item in value.items():
+            try:
+                if key_converter is not None:
+                    key = key_converter(key)
+                if value_converter is not None:
+                    item = value_converter(item)
+            except BindError as err:
+                err.path.insert(0, str(key))
+                raise
+            converted[key] = item
+        return converted
+
+    return convert
@@ -0,0 +1,157 @@
+import gzip
+import os
+import tempfile
+import zlib
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional
+
+from tonberry.util import run_in_executor
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Ordered by preference when the client rates several encodings equally
+ENCODING_EXTENSIONS = {"br": ".br", "gzip": ".gz"}
+
+# Encodings used for compressing handler responses on the fly, mapped to the
+# zlib wbits that produce them
+RESPONSE_ENCODINGS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "application/ld+json",
+    "application/xml",
+    "application/xhtml+xml",
+    "image/svg+xml",
+)
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """
+    Turns an Accept-Encoding header into a mapping of encoding to quality
+
+    So "gzip, br;q=0.5" would become {'gzip': 1.0, 'br': 0.5}
+    """
+    accepted: Dict[str, float] = {}
+    if not header:
+        return accepted
+    for part in header.split(","):
+        encoding, _, params = part.partition(";")
+        encoding = encoding.strip().lower()
+        if not encoding:
+            continue
+        if encoding == "x-gzip":
+            encoding = "gzip"
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[encoding] = quality
+    return accepted
+
+
+def rank_encodings(accepted: Dict[str, float], offered: Iterable[str]) -> List[str]:
+    """
+    Returns the offered encodings the client accepts, best first
+    """
+    ranked = []
+    for preference, encoding in enumerate(offered):
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > 0:
+            ranked.append((-quality, preference, encoding))
+    return [encoding for *_, encoding in sorted(ranked)]
+
+
+def available_encodings() -> List[str]:
+    """
+    The encodings that can be produced here, br needs the brotli package
+    """
+    return [
+        encoding
+        for encoding in ENCODING_EXTENSIONS
+        if encoding != "br" or brotli is not None
+    ]
+
+
+def is_compressible(mime_type: Optional[str]) -> bool:
+    return mime_type is not None and mime_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compressed_path(path: Path, encoding: str) -> Path:
+    return path.with_name(path.name + ENCODING_EXTENSIONS[encoding])
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data)  # type: ignore
+    return gzip.compress(data, compresslevel=9)
+
+
+def compress_file(path: Path, encoding: str) -> Path:
+    """
+    Writes a compressed copy of the file next to it
+
+    The copy is written to a temporary file first and moved into place so a
+    half written one is never served.
+    """
+    target = compressed_path(path, encoding)
+    data = compress(path.read_bytes(), encoding)
+    descriptor, temp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}")
+    try:
+        with os.fdopen(descriptor, "wb") as temp_file:
+            temp_file.write(data)
+        os.replace(temp_name, target)
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+    return target
+
+
+def compressor(encoding: str, level: int) -> "zlib._Compress":
+    return zlib.compressobj(level, zlib.DEFLATED, RESPONSE_ENCODINGS[encoding])
+
+
+def compress_bytes(data: bytes, encoding: str, level: int) -> bytes:
+    response_compressor = compressor(encoding, level)
+    return response_compressor.compress(data) + response_compressor.flush()
+
+
+def _compress_chunk(response_compressor: "zlib._Compress", chunk: bytes) -> bytes:
+    return response_compressor.compress(chunk) + response_compressor.flush(
+        zlib.Z_SYNC_FLUSH
+    )
+
+
+async def compress_stream(
+    stream: AsyncIterable[bytes], encoding: str, level: int, offload_size: int
+) -> AsyncIterator[bytes]:
+    """
+    Compresses a streamed body chunk by chunk
+
+    Every chunk is flushed so the client gets it straight away instead of when
+    the compressor's buffer happens to fill. Chunks of offload_size or more are
+    compressed on the executor.
+    """
+    response_compressor = compressor(encoding, level)
+    try:
+        async for chunk in stream:
+            if len(chunk) >= offload_size:
+                compressed = await run_in_executor(
+                    _compress_chunk, response_compressor, chunk
+                )
+            else:
+                compressed = _compress_chunk(response_compressor, chunk)
+            if compressed:
+                yield compressed
+        yield response_compressor.flush()
+    finally:
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -1,8 +1,9 @@
 import json
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from logging import getLogger
 from pathlib import Path
+from typing import List
 
 
 @dataclass
@@ -12,6 +13,43 @@ class Config:
     LOG_LEVEL: str = "DEBUG"
     ACCESS_LOGGING: bool = True
     JINJA_TEMPLATE_PATH: str = "."
+    JINJA_BYTECODE_CACHE_DIR: str = ""
+    JINJA_PRECOMPILE: bool = False
+    JINJA_ENABLE_ASYNC: bool = False
+    ROUTE_CACHE_SIZE: int = 1024
+    ROUTE_CACHE_MISS_TTL: float = 5.0
+    ROUTE_MISS_CACHE_SIZE: int = 256
+    RESPONSE_CHUNK_SIZE: int = 65536
+    SINGLE_MESSAGE_MAX_SIZE: int = 1048576
+    WORKER_THREADS: int = 4
+    STATIC_CACHE_SIZE: int = 1024
+    STATIC_CACHE_MAX_BYTES: int = 67108864
+    STATIC_CACHE_MAX_FILE_SIZE: int = 1048576
+    STATIC_CACHE_REVALIDATE: float = 2.0
+    STATIC_MISS_CACHE_SIZE: int = 256
+    STATIC_PRECOMPRESSED: bool = True
+    STATIC_COMPRESS_MISSING: bool = False
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESS_RESPONSES: bool = False
+    COMPRESSION_LEVEL: int = 6
+    COMPRESSION_OFFLOAD_SIZE: int = 262144
+    JSON_BACKEND: str = "json"
+    JSON_OFFLOAD_THRESHOLD: int = 10000
+    MULTIPART_SPOOL_SIZE: int = 1048576
+    MULTIPART_MAX_FIELD_SIZE: int = 1048576
+    MULTIPART_MEMORY_LIMIT: int = 4194304
+    MULTIPART_MAX_FILES: int = 1000
+    MULTIPART_MAX_FIELDS: int = 1000
+    USER_AGENT_CACHE_SIZE: int = 512
+    SESSION_MAX_ENTRIES: int = 10000
+    SESSION_IDLE_TTL: float = 1800.0
+    SESSION_DB_PATH: str = ""
+    SESSION_CACHE_TTL: float = 5.0
+    SESSION_FLUSH_INTERVAL: float = 0.5
+    SESSION_FLUSH_BATCH_SIZE: int = 256
+    SESSION_SNAPSHOT_PATH: str = ""
+    SESSION_COOKIE_SECRETS: List[str] = field(default_factory=list)
+    SESSION_COOKIE_MAX_SIZE: int = 4000
 
 
 def config_init() -> Config:
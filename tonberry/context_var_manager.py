@@ -10,9 +10,12 @@ class ContextVarManager:
     def _context(self) -> Any:
         return self._context_var.get()
 
-    def get(self, item: Hashable, default: Any) -> Any:
+    def get(self, item: Hashable, default: Any = None) -> Any:
         return self._context.get(item, default)
 
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._context
+
     def __getitem__(self, item: Hashable) -> Any:
         return self._context[item]
 
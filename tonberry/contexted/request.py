@@ -1,12 +1,42 @@
-from typing import Any, AsyncGenerator, Dict, Optional, Tuple, Union
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple, Union
 from urllib.parse import ParseResult, ParseResultBytes, parse_qs, urlparse
 
 import user_agents
 from user_agents.parsers import UserAgent
 
+from tonberry.exceptions import HTTPError
 from tonberry.header import Header
 from tonberry.models import Receive, Scope, StrOrBytes, TreePart
-from tonberry.util import format_data
+from tonberry.multipart import MultipartParser, UploadFile, parse_options
+from tonberry.util import LRUCache, format_data
+
+_user_agent_cache: Optional[LRUCache] = None
+
+
+def get_user_agent_cache() -> LRUCache:
+    """
+    Returns the process wide cache of parsed User-Agent headers, its hit and
+    miss counts are available through cache_info()
+    """
+    global _user_agent_cache
+    if _user_agent_cache is None:
+        from tonberry import config
+
+        _user_agent_cache = LRUCache(config.USER_AGENT_CACHE_SIZE)
+    return _user_agent_cache
+
+
+def parse_user_agent(user_agent: str) -> UserAgent:
+    """
+    Parses a User-Agent header, reusing the result for strings seen before
+    since clients send the same few strings over and over
+    """
+    cache = get_user_agent_cache()
+    parsed = cache.get(user_agent)
+    if parsed is None:
+        parsed = user_agents.parse(user_agent)
+        cache.set(user_agent, parsed)
+    return parsed
 
 
 class Request:
@@ -15,16 +45,20 @@ class Request:
         self.method = str(scope.get("method"))
         self.type = scope.get("type")
         self.http_version = scope.get("http_version")
-        self._uri: Union[ParseResult, ParseResultBytes] = urlparse(scope.get("path"))
+        self._path: str = scope.get("path")  # type: ignore
+        self._uri: Optional[Union[ParseResult, ParseResultBytes]] = None
         self.raw_uri = scope.get("raw_path")
         self.root_path = scope.get("root_path")
         self.client: Tuple[str, str] = scope.get("client")  # type: ignore
         self._query_string = scope.get("query_string")
+        self._query: Optional[Dict] = None
         self._body: Optional[bytes] = None
+        self._form: Optional[Dict[str, Any]] = None
+        self._uploads: List[UploadFile] = []
         self.headers = Header(scope.get("headers"))
         self.current_route: Optional[TreePart] = None
         self._unsearched_path: str = ""
-        self._user_agent: str = ""
+        self._user_agent: Optional[UserAgent] = None
         self._scope = scope
 
     async def stream(self) -> AsyncGenerator[bytes, None]:
@@ -48,32 +82,69 @@ class Request:
             self._body = b"".join(chunks)
         return self._body
 
+    async def form(self) -> Dict[str, Any]:
+        """
+        Parses a multipart/form-data body straight from the stream, fields are
+        strings and files are UploadFiles that get closed with the request
+        """
+        if self._form is None:
+            from tonberry import config
+
+            content_type, options = parse_options(self.headers["content-type"] or "")
+            if content_type != "multipart/form-data" or not options.get("boundary"):
+                raise HTTPError(400, "Expected a multipart/form-data body")
+            parser = MultipartParser(
+                options["boundary"].encode("latin-1"),
+                config.MULTIPART_SPOOL_SIZE,
+                config.MULTIPART_MAX_FIELD_SIZE,
+                config.MULTIPART_MEMORY_LIMIT,
+                config.MULTIPART_MAX_FILES,
+                config.MULTIPART_MAX_FIELDS,
+            )
+            self._form = await parser.parse(self.stream())
+            self._uploads = parser.uploads
+        return self._form
+
+    async def close(self) -> None:
+        for upload in self._uploads:
+            await upload.close()
+
     @property
     def body(self) -> Optional[bytes]:
         return self._body
 
+    @property
+    def uri(self) -> Union[ParseResult, ParseResultBytes]:
+        """
+        The path split up by urlparse, only done when one of its parts is needed
+        """
+        if self._uri is None:
+            self._uri = urlparse(self._path)
+        return self._uri
+
     @property
     def path(self) -> str:
-        if isinstance(self._uri.path, bytes):
-            return self._uri.path.decode("utf-8")
-        else:
-            return self._uri.path
+        if isinstance(self._path, bytes):
+            return self._path.decode("utf-8")
+        return self._path
 
     @property
     def scheme(self) -> StrOrBytes:
-        return self._uri.scheme
+        return self.uri.scheme
 
     @property
     def netloc(self) -> StrOrBytes:
-        return self._uri.netloc
+        return self.uri.netloc
 
     @property
     def params(self) -> StrOrBytes:
-        return self._uri.params
+        return self.uri.params
 
     @property
     def query_string(self) -> Dict:
-        return format_data(parse_qs(self._query_string))
+        if self._query is None:
+            self._query = format_data(parse_qs(self._query_string))
+        return self._query
 
     @property
     def raw_query_string(self) -> Any:
@@ -81,28 +152,26 @@ class Request:
 
     @property
     def fragment(self) -> StrOrBytes:
-        return self._uri.fragment
+        return self.uri.fragment
 
     @property
     def username(self) -> Optional[StrOrBytes]:
-        return self._uri.username
+        return self.uri.username
 
     @property
     def password(self) -> Optional[StrOrBytes]:
-        return self._uri.password
+        return self.uri.password
 
     @property
     def hostname(self) -> Optional[StrOrBytes]:
-        return self._uri.hostname
+        return self.uri.hostname
 
     @property
     def port(self) -> Optional[int]:
-        return self._uri.port
+        return self.uri.port
 
     @property
     def user_agent(self) -> UserAgent:
-        if not self._user_agent:
-            self._user_agent = user_agents.parse(
-                self.headers["user-agent"] or "unknown"
-            )
+        if self._user_agent is None:
+            self._user_agent = parse_user_agent(self.headers["user-agent"] or "unknown")
         return self._user_agent
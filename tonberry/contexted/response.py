@@ -1,23 +1,49 @@
+from typing import AsyncIterable, AsyncIterator, Optional, Union
+
 from tonberry.header import Header
+from tonberry.models import ResponseBody
+from tonberry.util import File
 
 
 class Body:
-    chunk_size = 1024
+    chunk_size = 65536
+
+    def __init__(self, data: ResponseBody = b""):
+        self.data = b""
+        self.stream: Optional[AsyncIterable[bytes]] = None
+        self.file: Optional[File] = None
+        self.set(data)
+
+    def set(self, data: ResponseBody) -> None:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            self.data = bytes(data)
+            self.stream = None
+        else:
+            self.data = b""
+            self.stream = data
+        self.file = data if isinstance(data, File) else None
+
+    @property
+    def is_streaming(self) -> bool:
+        return self.stream is not None
 
-    def __init__(self, data: bytes):
-        self.data = data
-        self._position = 0
+    def __aiter__(self) -> AsyncIterator[Union[bytes, memoryview]]:
+        if self.stream is not None:
+            return self.stream.__aiter__()
+        return self.chunks(self.chunk_size)
 
-    def __aiter__(self) -> "Body":
-        return self
+    async def chunks(self, chunk_size: int) -> AsyncIterator[memoryview]:
+        """
+        Slices the data without copying it
+        """
+        view = memoryview(self.data)
+        for position in range(0, len(view), chunk_size):
+            yield view[position : position + chunk_size]
 
-    async def __anext__(self) -> bytes:
-        data = self.data[self._position : self._position + self.chunk_size]
-        if not data:
-            self._position = 0
-            raise StopAsyncIteration
-        self._position += self.chunk_size
-        return data
+    async def aclose(self) -> None:
+        aclose = getattr(self.stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
 
 
 class Response:
@@ -26,6 +52,7 @@ class Response:
         self.headers: Header = headers or Header()
         self.status: int = 200
         self._content_type: str = ""
+        # Seconds sending the response may go without making any progress
         self.timeout = 60
 
     @property
@@ -33,8 +60,8 @@ class Response:
         return self._body
 
     @body.setter
-    def body(self, data: bytes) -> None:
-        self._body.data = data
+    def body(self, data: ResponseBody) -> None:
+        self._body.set(data)
 
     @property
     def content_type(self) -> str:
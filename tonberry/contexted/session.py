@@ -1,11 +1,24 @@
-from typing import Any, Dict, Hashable
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
 from uuid import UUID
 
+from tonberry.util import CacheInfo
+
 
 class Session:
-    def __init__(self, session_id: UUID, data: Dict = None):
+    """
+    A session without a session_id has not been stored yet, it only gets an id
+    and is added to the store once something is written to it
+    """
+
+    def __init__(self, session_id: UUID = None, data: Dict = None):
         self.session_id = session_id
         self.data = data or {}
+        self.modified = False
+        self.last_accessed = self.loaded_at = time.monotonic()
+        # Fingerprint of the data as last loaded or saved through a backend or cookie
+        self.digest: Optional[bytes] = None
 
     def get(self, item: Hashable, default: Any = None) -> Any:
         return self.data.get(item, default)
@@ -15,22 +28,111 @@ class Session:
 
     def __setitem__(self, key: Hashable, value: Any) -> None:
         self.data[key] = value
+        self.modified = True
+
+    def __delitem__(self, key: Hashable) -> None:
+        del self.data[key]
+        self.modified = True
 
     def __contains__(self, item: Hashable) -> bool:
         return item in self.data
 
 
 class SessionStore:
-    def __init__(self, sessions: Dict[UUID, Session] = None):
-        self.sessions = sessions or {}
+    """
+    Keeps sessions in least recently used order, dropping those left idle for
+    longer than ttl seconds and the oldest ones once there are more than maxsize
+
+    Since every access moves a session to the end, idle sessions collect at the
+    front and are cleared from there as new sessions are added, so each one
+    costs O(1) to remove. A maxsize or ttl of None means no limit.
+    """
+
+    def __init__(
+        self,
+        sessions: Dict[UUID, Session] = None,
+        maxsize: Optional[int] = 10000,
+        ttl: Optional[float] = 1800.0,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sessions: "OrderedDict[UUID, Session]" = OrderedDict(sessions or {})
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self.sessions)
 
     def __getitem__(self, item: UUID) -> Session:
-        if item not in self.sessions:
-            self.sessions[item] = Session(item)
-        return self.sessions[item]
+        session = self.get(item)
+        if session is None:
+            raise KeyError(item)
+        return session
 
     def __setitem__(self, key: UUID, value: Session) -> None:
+        value.last_accessed = time.monotonic()
         self.sessions[key] = value
+        self.sessions.move_to_end(key)
+        self.purge()
+
+    def __delitem__(self, key: UUID) -> None:
+        del self.sessions[key]
 
     def __contains__(self, item: UUID) -> bool:
-        return item in self.sessions
+        session = self.sessions.get(item)
+        return session is not None and not self._expired(session, time.monotonic())
+
+    def get(self, item: UUID, default: Session = None) -> Optional[Session]:
+        """
+        Returns the session and marks it as used, expired sessions are removed
+        and treated as missing
+        """
+        session = self.sessions.get(item)
+        now = time.monotonic()
+        if session is None or self._expired(session, now):
+            if session is not None:
+                del self.sessions[item]
+                self.expirations += 1
+            self.misses += 1
+            return default
+        session.last_accessed = now
+        self.sessions.move_to_end(item)
+        self.hits += 1
+        return session
+
+    def pop(self, key: UUID, default: Session = None) -> Optional[Session]:
+        return self.sessions.pop(key, default)
+
+    def purge(self) -> None:
+        """
+        Removes idle sessions from the front, then the least recently used ones
+        until there are no more than maxsize
+        """
+        now = time.monotonic()
+        while self.sessions:
+            session = next(iter(self.sessions.values()))
+            if not self._expired(session, now):
+                break
+            self.sessions.popitem(last=False)
+            self.expirations += 1
+        if self.maxsize is not None:
+            while len(self.sessions) > self.maxsize:
+                self.sessions.popitem(last=False)
+                self.evictions += 1
+
+    def cache_info(self) -> CacheInfo:
+        """
+        Live sessions are reported as currsize, evictions include expirations
+        """
+        return CacheInfo(
+            self.hits,
+            self.misses,
+            self.evictions + self.expirations,
+            self.maxsize or 0,
+            len(self.sessions),
+        )
+
+    def _expired(self, session: Session, now: float) -> bool:
+        return self.ttl is not None and now - session.last_accessed > self.ttl
@@ -0,0 +1,116 @@
+import hashlib
+import hmac
+import json
+import time
+import zlib
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+COMPRESS_MIN_SIZE = 128
+
+
+def _b64encode(data: bytes) -> str:
+    return urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class SessionSigner:
+    """
+    Turns session data into a signed cookie value and back, so the session is
+    kept by the client and the server stores nothing
+
+    The data is encoded as JSON, compressed when that makes it smaller and
+    signed with HMAC-SHA256. New values are signed with the first secret, values
+    signed with any of the others are still accepted so secrets can be rotated.
+    Values are only readable by the client, not changeable, so don't keep
+    anything secret in them.
+    """
+
+    def __init__(
+        self,
+        secrets: Sequence[Union[str, bytes]],
+        max_size: int = 4000,
+        max_age: float = None,
+    ) -> None:
+        if not secrets:
+            raise ValueError("At least one secret is needed to sign sessions")
+        self.keys = [
+            hmac.new(
+                secret.encode("utf-8") if isinstance(secret, str) else secret,
+                b"tonberry.session",
+                hashlib.sha256,
+            ).digest()
+            for secret in secrets
+        ]
+        self.max_size = max_size
+        self.max_age = max_age
+
+    def digest(self, data: Dict) -> bytes:
+        """
+        Returns a fingerprint of the data, the app compares it before and after a
+        request to notice changes made in place, like appending to a list
+        """
+        return hashlib.blake2b(self._encode(data)).digest()
+
+    def dumps(self, data: Dict) -> str:
+        body = self._encode(data)
+        flag = "j"
+        if len(body) >= COMPRESS_MIN_SIZE:
+            compressed = zlib.compress(body)
+            if len(compressed) < len(body):
+                body = compressed
+                flag = "z"
+        message = f"{flag}{_b64encode(body)}.{int(time.time())}"
+        value = f"{message}.{self._sign(self.keys[0], message)}"
+        if len(value) > self.max_size:
+            raise ValueError(
+                f"Session cookie of {len(value)} bytes is larger than the limit of "
+                f"{self.max_size}, keep less data in the session"
+            )
+        return value
+
+    def loads(self, value: str) -> Tuple[Optional[Dict], bool]:
+        """
+        Returns the data, or None if the value is invalid or has expired, and
+        whether it should be signed again because it is old or used an old secret
+        """
+        if len(value) > self.max_size:
+            return None, False
+        message, _, signature = value.rpartition(".")
+        for position, key in enumerate(self.keys):
+            if hmac.compare_digest(self._sign(key, message), signature):
+                break
+        else:
+            return None, False
+        payload, _, timestamp = message.rpartition(".")
+        try:
+            age = time.time() - int(timestamp)
+            body = _b64decode(payload[1:])
+            if payload[:1] == "z":
+                decompressor = zlib.decompressobj()
+                body = decompressor.decompress(body, self.max_size * 16)
+                if decompressor.unconsumed_tail:
+                    return None, False
+            data = json.loads(body)
+        except (ValueError, zlib.error):
+            return None, False
+        if not isinstance(data, dict):
+            return None, False
+        if self.max_age is not None:
+            if age > self.max_age:
+                return None, False
+            return data, position > 0 or age > self.max_age / 2
+        return data, position > 0
+
+    @staticmethod
+    def _encode(data: Dict) -> bytes:
+        return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+    @staticmethod
+    def _sign(key: bytes, message: str) -> str:
+        return _b64encode(
+            hmac.digest(key, message.encode("ascii", "replace"), "sha256")
+        )
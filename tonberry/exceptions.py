@@ -1,3 +1,6 @@
+from typing import List
+
+
 class TonberryException(Exception):
     pass
 
@@ -9,6 +12,23 @@ class HTTPRedirect(TonberryException):
 
 
 class HTTPError(TonberryException):
+    def __str__(self) -> str:
+        return str(self.args[-1]) if self.args else ""
+
+
+class BindError(HTTPError):
+    def __init__(self, message: str, path: List[str] = None):
+        super().__init__(400, message)
+        self.message = message
+        self.path = path or []
+
+    def __str__(self) -> str:
+        if self.path:
+            return f"{'.'.join(self.path)}: {self.message}"
+        return self.message
+
+
+class ResponseTimeoutError(TonberryException):
     pass
 
 
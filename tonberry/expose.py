@@ -3,6 +3,7 @@ from typing import Callable, Optional, Union
 
 from tonberry.exceptions import FigureItOutLaterException
 from tonberry.models import Methods, RouteMapping
+from tonberry.serializers import JSON_ENCODINGS
 
 
 class _Expose:
@@ -19,7 +20,13 @@ class _Expose:
         http_method: str,
         route: Optional[Union[str, Callable]] = None,
         frame_index: int = 3,
+        json_encoding: Optional[str] = None,
     ) -> None:
+        if json_encoding is not None and json_encoding not in JSON_ENCODINGS:
+            raise ValueError(
+                f"json_encoding must be one of {', '.join(JSON_ENCODINGS)}, "
+                f"not {json_encoding!r}"
+            )
         if route is None or not isinstance(route, str):
             route = func.__name__
         # noinspection PyProtectedMember
@@ -29,14 +36,18 @@ class _Expose:
             qual_name = parents["__qualname__"]
         else:
             raise FigureItOutLaterException
-        cls._registrar.get(http_method).mappings.append(
-            RouteMapping(route, func, module_name, qual_name, http_method)
+        cls._registrar.get(http_method).add(
+            RouteMapping(
+                route, func, module_name, qual_name, http_method, json_encoding
+            )
         )
 
     @classmethod
-    def get(cls, route: Union[str, Callable] = None) -> Callable:
+    def get(
+        cls, route: Union[str, Callable] = None, json_encoding: Optional[str] = None
+    ) -> Callable:
         def wrapper(wrapped_func: Callable, frame_index: int = 2) -> Callable:
-            cls._register(wrapped_func, "GET", route, frame_index)
+            cls._register(wrapped_func, "GET", route, frame_index, json_encoding)
             return wrapped_func
 
         if callable(route):
@@ -47,9 +58,11 @@ class _Expose:
             return wrapper
 
     @classmethod
-    def post(cls, route: Union[str, Callable] = None) -> Callable:
+    def post(
+        cls, route: Union[str, Callable] = None, json_encoding: Optional[str] = None
+    ) -> Callable:
         def wrapper(wrapped_func: Callable, frame_index: int = 2) -> Callable:
-            cls._register(wrapped_func, "POST", route, frame_index)
+            cls._register(wrapped_func, "POST", route, frame_index, json_encoding)
             return wrapped_func
 
         if callable(route):
@@ -60,9 +73,11 @@ class _Expose:
             return wrapper
 
     @classmethod
-    def put(cls, route: Union[str, Callable] = None) -> Callable:
+    def put(
+        cls, route: Union[str, Callable] = None, json_encoding: Optional[str] = None
+    ) -> Callable:
         def wrapper(wrapped_func: Callable, frame_index: int = 2) -> Callable:
-            cls._register(wrapped_func, "PUT", route, frame_index)
+            cls._register(wrapped_func, "PUT", route, frame_index, json_encoding)
             return wrapped_func
 
         if callable(route):
@@ -73,9 +88,11 @@ class _Expose:
             return wrapper
 
     @classmethod
-    def delete(cls, route: Union[str, Callable] = None) -> Callable:
+    def delete(
+        cls, route: Union[str, Callable] = None, json_encoding: Optional[str] = None
+    ) -> Callable:
         def wrapper(wrapped_func: Callable, frame_index: int = 2) -> Callable:
-            cls._register(wrapped_func, "DELETE", route, frame_index)
+            cls._register(wrapped_func, "DELETE", route, frame_index, json_encoding)
             return wrapped_func
 
         if callable(route):
@@ -86,9 +103,11 @@ class _Expose:
             return wrapper
 
     @classmethod
-    def patch(cls, route: Union[str, Callable] = None) -> Callable:
+    def patch(
+        cls, route: Union[str, Callable] = None, json_encoding: Optional[str] = None
+    ) -> Callable:
         def wrapper(wrapped_func: Callable, frame_index: int = 2) -> Callable:
-            cls._register(wrapped_func, "PATCH", route, frame_index)
+            cls._register(wrapped_func, "PATCH", route, frame_index, json_encoding)
             return wrapped_func
 
         if callable(route):
@@ -99,9 +118,11 @@ class _Expose:
             return wrapper
 
     @classmethod
-    def head(cls, route: Union[str, Callable] = None) -> Callable:
+    def head(
+        cls, route: Union[str, Callable] = None, json_encoding: Optional[str] = None
+    ) -> Callable:
         def wrapper(wrapped_func: Callable, frame_index: int = 2) -> Callable:
-            cls._register(wrapped_func, "HEAD", route, frame_index)
+            cls._register(wrapped_func, "HEAD", route, frame_index, json_encoding)
             return wrapped_func
 
         if callable(route):
@@ -112,9 +133,11 @@ class _Expose:
             return wrapper
 
     @classmethod
-    def options(cls, route: Union[str, Callable] = None) -> Callable:
+    def options(
+        cls, route: Union[str, Callable] = None, json_encoding: Optional[str] = None
+    ) -> Callable:
         def wrapper(wrapped_func: Callable, frame_index: int = 2) -> Callable:
-            cls._register(wrapped_func, "OPTIONS", route, frame_index)
+            cls._register(wrapped_func, "OPTIONS", route, frame_index, json_encoding)
             return wrapped_func
 
         if callable(route):
@@ -125,9 +148,11 @@ class _Expose:
             return wrapper
 
     @classmethod
-    def websocket(cls, route: Union[str, Callable] = None) -> Callable:
+    def websocket(
+        cls, route: Union[str, Callable] = None, json_encoding: Optional[str] = None
+    ) -> Callable:
         def wrapper(wrapped_func: Callable, frame_index: int = 2) -> Callable:
-            cls._register(wrapped_func, "WEBSOCKET", route, frame_index)
+            cls._register(wrapped_func, "WEBSOCKET", route, frame_index, json_encoding)
             return wrapped_func
 
         if callable(route):
@@ -1,18 +1,29 @@
 import asyncio
 import traceback
-from typing import TYPE_CHECKING
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Optional,
+    TypeVar,
+)
 
 from tonberry import response as response_context
 from tonberry.context_var_manager import set_context_var
 from tonberry.contexted.request import Request
 from tonberry.contexted.response import Response
-from tonberry.exceptions import HTTPError, HTTPRedirect
-from tonberry.models import Receive, Scope, Send
+from tonberry.contexted.session import Session
+from tonberry.exceptions import HTTPError, HTTPRedirect, ResponseTimeoutError
+from tonberry.models import Message, Receive, Scope, Send
+from tonberry.util import File
 from tonberry.websocket import WebSocket
 
 if TYPE_CHECKING:
     from tonberry.app import App
 
+T = TypeVar("T")
+
 
 class Handler:
     def __init__(self, app: "App", scope: Scope):
@@ -26,6 +37,8 @@ class Handler:
 class HTTPHandler(Handler):
     def __init__(self, app: "App", scope: Scope):
         super().__init__(app, scope)
+        self.response_started = False
+        self.session: Optional[Session] = None
 
     async def __call__(self, recieve: Receive, send: Send) -> None:
         request = Request(self.scope, recieve)
@@ -35,14 +48,22 @@ class HTTPHandler(Handler):
             response = Response()
             response.status = err.args[0]
             # noinspection PyTypeHints
-            response.body = str(err.args[0]).encode("utf-8")  # type: ignore
+            response.body = str(err).encode("utf-8")  # type: ignore
             set_context_var(response_context, response)
             self.app.http_access_logger.error()
             await self.handle_exception(response, send)
+        except ResponseTimeoutError as err:
+            self.app.http_access_logger.error(str(err))
+            # Raising once the response has started makes the server drop the
+            # connection, so the client can tell the body is incomplete
+            raise
         except HTTPRedirect as err:
             response = Response()
             response.status = err.code
             response.headers["Location"] = err.route
+            if self.session is not None:
+                # Handlers often store something, like a login, then redirect
+                await self.app.save_session(self.session, response)
             set_context_var(response_context, response)
             self.app.http_access_logger.info()
             await self.handle_exception(response, send)
@@ -55,34 +76,122 @@ class HTTPHandler(Handler):
             self.app.http_access_logger.error()
             self.app.app_logger.exception(err)
             await self.handle_exception(response, send)
+        finally:
+            await request.close()
 
     async def handle_request(self, request: Request, send: Send) -> None:
-        session_id = self.app.get_session_id(request)
+        self.session = await self.app.get_session(request)
         response: Response = await self.app.handle_request(request)
-        if request.headers.get_cookie("TBSESSIONID") is None:
-            response.headers.set_cookie(
-                "TBSESSIONID",
-                str(session_id),
-                path=request.path,
-                domain=request.hostname,
+        await self.app.save_session(self.session, response)
+        await self.respond(send, response)
+
+    async def handle_exception(self, response: Response, send: Send) -> None:
+        if self.response_started:
+            # A streamed body failed part way through, all that can be done now is
+            # to cut it short
+            return
+        await self.respond(send, response)
+
+    async def respond(self, send: Send, response: Response) -> None:
+        """
+        Sends the response, response.timeout limits how long any single step
+        may take rather than the whole response, so long downloads and streams
+        can run for as long as they keep moving
+        """
+        timeout = response.timeout
+
+        async def send_message(message: Message) -> None:
+            await self._wait(send(message), timeout)
+
+        await self._respond(send_message, response)
+
+    async def _respond(self, send: Send, response: Response) -> None:
+        body = response.body
+        if body.file is not None:
+            await self.send_file(send, response, body.file)
+            return
+        if body.is_streaming:
+            await self.start_response(send, response)
+            try:
+                async for data in self._iterate(body, response.timeout):
+                    await send(
+                        {"type": "http.response.body", "body": data, "more_body": True}
+                    )
+            finally:
+                await body.aclose()
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        length = len(body.data)
+        if response.status >= 200 and response.status not in (204, 304):
+            response.headers["content-length"] = length
+        await self.start_response(send, response)
+        if length <= self.app.config.SINGLE_MESSAGE_MAX_SIZE:
+            await send({"type": "http.response.body", "body": body.data})
+            return
+        chunk_size = self.app.config.RESPONSE_CHUNK_SIZE
+        sent = 0
+        async for chunk in self._iterate(body.chunks(chunk_size), response.timeout):
+            sent += len(chunk)
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": sent < length,
+                }
             )
-        try:
-            await asyncio.wait_for(
-                self.respond(send, response), timeout=response.timeout
+
+    async def send_file(self, send: Send, response: Response, file: File) -> None:
+        length = await file.size()
+        response.headers["content-length"] = length
+        await self.start_response(send, response)
+        if not file.is_partial and "http.response.pathsend" in self.scope.get(
+            "extensions", {}
+        ):
+            await send(
+                {"type": "http.response.pathsend", "path": str(file.path.absolute())}
             )
-        except asyncio.TimeoutError:
-            pass
+            return
+        if length <= self.app.config.SINGLE_MESSAGE_MAX_SIZE:
+            await send({"type": "http.response.body", "body": await file.read()})
+            return
+        sent = 0
+        async for chunk in self._iterate(file.stream(), response.timeout):
+            sent += len(chunk)
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": sent < length,
+                }
+            )
+            if sent >= length:
+                break
+        if sent < length:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def _iterate(
+        self, chunks: AsyncIterable[T], timeout: float
+    ) -> AsyncIterator[T]:
+        iterator = chunks.__aiter__()
+        while True:
+            try:
+                chunk = await self._wait(iterator.__anext__(), timeout)
+            except StopAsyncIteration:
+                return
+            yield chunk
 
-    async def handle_exception(self, response: Response, send: Send) -> None:
+    @staticmethod
+    async def _wait(step: Awaitable[T], timeout: float) -> T:
         try:
-            await asyncio.wait_for(
-                self.respond(send, response), timeout=response.timeout
-            )
+            return await asyncio.wait_for(step, timeout)
         except asyncio.TimeoutError:
-            pass
+            raise ResponseTimeoutError(
+                f"No progress sending the response for {timeout} seconds, "
+                f"the connection was aborted"
+            ) from None
 
-    @staticmethod
-    async def respond(send: Send, response: Response) -> None:
+    async def start_response(self, send: Send, response: Response) -> None:
         await send(
             {
                 "type": "http.response.start",
@@ -90,9 +199,7 @@ class HTTPHandler(Handler):
                 "headers": response.headers.encode(),
             }
         )
-        async for data in response.body:
-            await send({"type": "http.response.body", "body": data, "more_body": True})
-        await send({"type": "http.response.body", "body": b"", "more_body": False})
+        self.response_started = True
 
 
 class WebSocketHandler(Handler):
@@ -111,18 +218,22 @@ class LifespanHandler(Handler):
         super().__init__(app, scope)
 
     async def __call__(self, recieve: Receive, send: Send) -> None:
-        message = await recieve()
-        if message["type"] == "lifespan.startup":
-            try:
-                self.app.startup()
-            except Exception as err:
-                await send({"type": "lifespan.startup.failed", "message": str(err)})
-            else:
+        while True:
+            message = await recieve()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.app.startup()
+                except Exception as err:
+                    await send({"type": "lifespan.startup.failed", "message": str(err)})
+                    return
                 await send({"type": "lifespan.startup.complete"})
-        elif message["type"] == "lifespan.shutdown":
-            try:
-                self.app.shutdown()
-            except Exception as err:
-                await send({"type": "lifespan.shutdown.failed", "message": str(err)})
-            else:
-                await send({"type": "lifespan.shutdown.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                try:
+                    await self.app.shutdown()
+                except Exception as err:
+                    await send(
+                        {"type": "lifespan.shutdown.failed", "message": str(err)}
+                    )
+                else:
+                    await send({"type": "lifespan.shutdown.complete"})
+                return
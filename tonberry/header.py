@@ -1,48 +1,153 @@
 from datetime import datetime
+from functools import lru_cache
 from http.cookies import SimpleCookie
-from typing import Dict, Optional, Union
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
 from tonberry.models import HeaderList, StrOrBytes
 
 
+@lru_cache(maxsize=256)
+def _encode_name(name: str) -> bytes:
+    return name.lower().encode("latin-1")
+
+
+# Values sent on many responses are encoded once, anything else is encoded as
+# it is set so one-off values like session cookies aren't kept around
+_COMMON_VALUES = {
+    value: value.encode("latin-1")
+    for value in (
+        "text/html",
+        "text/plain",
+        "text/css",
+        "text/javascript",
+        "application/json",
+        "application/javascript",
+        "application/octet-stream",
+        "image/png",
+        "image/jpeg",
+        "image/svg+xml",
+        "Accept-Encoding",
+        "bytes",
+        "gzip",
+        "deflate",
+        "br",
+        "identity",
+        "no-cache",
+        "close",
+        "keep-alive",
+    )
+}
+
+
+def _encode_value(value: str) -> bytes:
+    encoded = _COMMON_VALUES.get(value)
+    if encoded is None:
+        return value.encode("utf-8")
+    return encoded
+
+
 class Header:
+    """
+    A case-insensitive multi-dict kept as the raw ASGI list of (name, value) bytes
+
+    Names are stored lowercase, the form ASGI servers pass them in, so lookups
+    compare bytes directly. Values are only decoded when they are looked up and
+    repeated headers are kept as separate entries. Reading a repeated header
+    gives the values joined with commas, get_all gives them one by one. Names
+    and common values are encoded once and reused.
+    """
+
     def __init__(self, header: HeaderList = None):
-        if header is None:
-            header = []
-        self._header = header
-        self._header_attrs: Dict[str, str] = {}
-        self.decode()
+        self._header: HeaderList = header if header is not None else []
+        self._owned = header is None
+        # Built on first use, it maps each name to its last value
+        self._index: Optional[Dict[bytes, bytes]] = None if header else {}
+        self._repeated = False
+        self._cookie: Optional[Tuple[str, SimpleCookie]] = None
 
     def __contains__(self, item: str) -> bool:
-        if item in self._header_attrs:
-            return True
-        return False
-
-    def __getitem__(self, item: str) -> Optional[str]:
-        if item in self._header_attrs:
-            return self._header_attrs[item]
-        return None
+        return _encode_name(item) in self._get_index()
 
     def __setitem__(self, key: str, value: Union[str, int]) -> None:
-        self._header_attrs[key] = str(value)
+        name = _encode_name(key)
+        encoded = _encode_value(str(value))
+        index = self._index if self._index is not None else self._get_index()
+        if not self._owned:
+            self._own()
+        if name in index:
+            self._header[:] = [
+                (key, value) for key, value in self._header if key != name
+            ]
+        self._header.append((name, encoded))
+        index[name] = encoded
 
     def __delitem__(self, key: str) -> None:
-        del self._header_attrs[key]
+        name = _encode_name(key)
+        index = self._get_index()
+        if name in index:
+            if not self._owned:
+                self._own()
+            self._header[:] = [
+                (key, value) for key, value in self._header if key != name
+            ]
+            del index[name]
+
+    def __len__(self) -> int:
+        return len(self._header)
+
+    def __iter__(self) -> Iterator[str]:
+        return (name.decode("latin-1") for name in self._get_index())
+
+    def get(self, key: str, default: str = None) -> Optional[str]:
+        name = _encode_name(key)
+        index = self._index if self._index is not None else self._get_index()
+        value = index.get(name)
+        if value is None:
+            return default
+        if self._repeated:
+            separator = "; " if name == b"cookie" else ", "
+            return separator.join(self._values(name))
+        return value.decode("utf-8")
+
+    __getitem__ = get
+
+    def get_all(self, key: str) -> List[str]:
+        return self._values(_encode_name(key))
+
+    def add(self, key: str, value: Union[str, int]) -> None:
+        """
+        Adds another value for the header, keeping any it already has
+        """
+        name = _encode_name(key)
+        encoded = _encode_value(str(value))
+        index = self._index if self._index is not None else self._get_index()
+        if not self._owned:
+            self._own()
+        if name in index:
+            self._repeated = True
+        self._header.append((name, encoded))
+        index[name] = encoded
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        for name, value in self._header:
+            yield name.decode("latin-1"), value.decode("utf-8")
 
     def encode(self) -> HeaderList:
-        raw_header = []
-        for header_key, attr in self._header_attrs.items():
-            key = bytes(header_key, "utf-8")
-            if attr is None:
-                value = b""
-            else:
-                value = bytes(attr, "utf-8")
-            raw_header.append((key, value))
-        return raw_header
-
-    def decode(self) -> None:
-        for key, value in self._header:
-            self._header_attrs[key.decode("utf-8")] = value.decode("utf-8")
+        return self._header
+
+    def _get_index(self) -> Dict[bytes, bytes]:
+        if self._index is None:
+            self._index = dict(self._header)
+            self._repeated = len(self._index) != len(self._header)
+        return self._index
+
+    def _values(self, name: bytes) -> List[str]:
+        return [value.decode("utf-8") for key, value in self._header if key == name]
+
+    def _own(self) -> None:
+        # The list from the ASGI scope is only copied when it is first changed
+        self._header = list(self._header)
+        self._owned = True
 
     def set_cookie(
         self,
@@ -55,9 +160,8 @@ class Header:
         max_age: int = None,
         comment: str = None,
         version: str = None,
+        httponly: bool = False,
     ) -> None:
-        if "Set-Cookie" not in self:
-            self._header_attrs["Set-Cookie"] = ""
         cookie: SimpleCookie = SimpleCookie()
         cookie[key] = morsel
         if path is not None:
@@ -74,18 +178,21 @@ class Header:
             cookie[key]["comment"] = comment
         if version is not None:
             cookie[key]["version"] = version
-        self._header_attrs["Set-Cookie"] += str(cookie)
+        if httponly:
+            cookie[key]["httponly"] = True
+        self.add("Set-Cookie", cookie[key].OutputString())
 
     def get_cookie(self, name: str = None) -> Optional[Union[SimpleCookie, str]]:
-        cookie: SimpleCookie = SimpleCookie()
-        if "cookie" in self._header_attrs:
-            cookie_dough = self._header_attrs["cookie"]
-            cookie_dough = cookie_dough.replace("Set-Cookie: ", "")
+        cookie_dough = self.get("cookie")
+        if cookie_dough is None:
+            return None
+        # Parsed once and reused for as long as the Cookie header is unchanged
+        if self._cookie is None or self._cookie[0] != cookie_dough:
+            cookie: SimpleCookie = SimpleCookie()
             cookie.load(cookie_dough)
-            if name is not None:
-                if name in cookie:
-                    morsel = cookie.get(name)
-                    if morsel is not None:
-                        return morsel.value
-            return cookie
-        return None
+            self._cookie = (cookie_dough, cookie)
+        cookie = self._cookie[1]
+        if name is not None:
+            morsel = cookie.get(name)
+            return morsel.value if morsel is not None else None
+        return cookie
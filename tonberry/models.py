@@ -1,11 +1,18 @@
 from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
 from typing import (
     Any,
+    AsyncIterable,
     Awaitable,
     Callable,
+    Dict,
+    FrozenSet,
     List,
+    Mapping,
     MutableMapping,
     Optional,
+    Sequence,
     Set,
     Tuple,
     Type,
@@ -20,6 +27,7 @@ class RouteMapping:
     module_name: Optional[str] = None
     qual_name: Optional[str] = None
     http_method: Optional[str] = None
+    json_encoding: Optional[str] = None
 
     def __bool__(self) -> bool:
         return (
@@ -45,26 +53,38 @@ class RouteMapping:
 class RouteMappings:
     mappings: List[RouteMapping] = field(default_factory=list)
     http_method: str = "GET"
+    _by_func: Dict[Tuple[Optional[str], str], RouteMapping] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    _by_route: Dict[Tuple[Optional[str], str], RouteMapping] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
 
-    def get_map_by_func(self, func_name: str, parent_name: str = None) -> RouteMapping:
+    def __post_init__(self) -> None:
         for mapping in self.mappings:
-            if mapping.func and mapping.func.__name__ == func_name:
-                if parent_name:
-                    if mapping.qual_name == parent_name:
-                        return mapping
-                else:
-                    return mapping
-        return RouteMapping()
+            self._index(mapping)
+
+    def _index(self, mapping: RouteMapping) -> None:
+        """
+        Keeps the first mapping registered for each key, which is the one the
+        lookups below returned back when they scanned the whole list
+        """
+        if mapping.func:
+            func_name = mapping.func.__name__
+            self._by_func.setdefault((None, func_name), mapping)
+            self._by_func.setdefault((mapping.qual_name, func_name), mapping)
+        self._by_route.setdefault((None, mapping.route), mapping)
+        self._by_route.setdefault((mapping.qual_name, mapping.route), mapping)
+
+    def add(self, mapping: RouteMapping) -> None:
+        self.mappings.append(mapping)
+        self._index(mapping)
+
+    def get_map_by_func(self, func_name: str, parent_name: str = None) -> RouteMapping:
+        return self._by_func.get((parent_name or None, func_name)) or RouteMapping()
 
     def get_map_by_route(self, route: str, parent_name: str = None) -> RouteMapping:
-        for mapping in self.mappings:
-            if mapping.route == route:
-                if parent_name:
-                    if mapping.qual_name == parent_name:
-                        return mapping
-                else:
-                    return mapping
-        return RouteMapping()
+        return self._by_route.get((parent_name or None, route)) or RouteMapping()
 
 
 @dataclass
@@ -123,6 +143,23 @@ class Methods:
         }
 
 
+@dataclass(frozen=True)
+class ParamPlan:
+    name: str
+    positional: bool
+    binder: Optional[Callable[[Dict[str, Any]], Any]] = None
+    binder_fields: FrozenSet[str] = frozenset()
+
+
+@dataclass(frozen=True)
+class CallPlan:
+    params: Tuple[ParamPlan, ...] = ()
+    var_positional: bool = False
+    var_keyword: bool = False
+    content_type: Optional[str] = None
+    json_encoding: Optional[str] = None
+
+
 class Node:
     def __init__(self, route: str, class_instance: Type):
         self.route = route
@@ -139,9 +176,16 @@ class Branch(Node):
 
 
 class Leaf(Node):
-    def __init__(self, route: str, class_instance: Type, route_mapping: RouteMapping):
+    def __init__(
+        self,
+        route: str,
+        class_instance: Type,
+        route_mapping: RouteMapping,
+        call_plan: CallPlan = None,
+    ):
         super().__init__(route, class_instance)
         self.route_mapping = route_mapping
+        self.call_plan = call_plan or CallPlan()
 
     def get_url(self) -> str:
         url = ""
@@ -154,7 +198,74 @@ class Leaf(Node):
         return f"/{url}"
 
 
+@dataclass(frozen=True)
+class RouteTrie:
+    leaves: Mapping[Tuple[str, str], Leaf]
+    branches: Mapping[str, "RouteTrie"]
+    index: Mapping[str, Leaf]
+
+    @classmethod
+    def compile(cls, branch: Branch) -> "RouteTrie":
+        """
+        Flattens a Branch into dict lookups keyed the same way the tree is searched
+
+        The first child matching a path segment wins, so a Leaf is only kept if
+        no Branch with the same route comes before it.
+        """
+        leaves: Dict[Tuple[str, str], Leaf] = {}
+        branches: Dict[str, RouteTrie] = {}
+        for child in branch.children:
+            if child.route in branches:
+                continue
+            if isinstance(child, Branch):
+                branches[child.route] = cls.compile(child)
+            elif child.route_mapping.http_method is not None:
+                key = (child.route, child.route_mapping.http_method)
+                leaves.setdefault(key, child)
+        index = {
+            http_method: leaf
+            for (route, http_method), leaf in leaves.items()
+            if route == "index"
+        }
+        return cls(
+            MappingProxyType(leaves),
+            MappingProxyType(branches),
+            MappingProxyType(index),
+        )
+
+    def find(
+        self, paths: Sequence[str], http_method: str
+    ) -> Optional[Tuple[Leaf, Sequence[str]]]:
+        node = self
+        for level, path in enumerate(paths):
+            leaf = node.leaves.get((path, http_method))
+            if leaf is not None:
+                return leaf, paths[level + 1 :]
+            branch = node.branches.get(path)
+            if branch is None:
+                return None
+            node = branch
+        leaf = node.index.get(http_method)
+        if leaf is not None:
+            return leaf, ()
+        return None
+
+
+@dataclass
+class StaticAsset:
+    path: Path
+    size: int
+    mtime_ns: int
+    etag: str
+    last_modified: str
+    mime_type: Optional[str] = None
+    encoding: Optional[str] = None
+    data: Optional[bytes] = None
+    checked_at: float = 0.0
+
+
 StrOrBytes = Union[str, bytes]
+ResponseBody = Union[bytes, AsyncIterable[bytes]]
 HeaderList = List[Tuple[bytes, bytes]]
 TreePart = Union[Branch, Leaf]
 
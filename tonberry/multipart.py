@@ -0,0 +1,320 @@
+import shutil
+import tempfile
+from pathlib import Path
+from typing import IO, Any, AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+from tonberry.exceptions import HTTPError
+from tonberry.util import run_in_executor
+
+MAX_HEADER_SIZE = 16384
+
+
+class UploadFile:
+    """
+    A file sent in a multipart/form-data request
+
+    Uploads stay in memory until they grow past spool_size, after that they are
+    written to an anonymous temporary file that is removed when it is closed.
+    Reads are done on the executor once an upload is on disk.
+    """
+
+    chunk_size = 65536
+
+    def __init__(
+        self,
+        name: str,
+        filename: str,
+        content_type: Optional[str] = None,
+        headers: Dict[str, str] = None,
+        spool_size: int = 1048576,
+    ) -> None:
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.headers = headers or {}
+        self.spool_size = spool_size
+        self.size = 0
+        self._buffer = bytearray()
+        self._file: Optional[IO[bytes]] = None
+        self._position = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"<UploadFile name={self.name!r} filename={self.filename!r} "
+            f"size={self.size}>"
+        )
+
+    @property
+    def in_memory(self) -> bool:
+        return self._file is None
+
+    @property
+    def memory_size(self) -> int:
+        return len(self._buffer)
+
+    async def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self._file is None and len(self._buffer) + len(data) <= self.spool_size:
+            self._buffer += data
+            return
+        await run_in_executor(self._write_to_file, data)
+
+    async def rollover(self) -> None:
+        """
+        Moves the upload to a temporary file now rather than once it reaches
+        spool_size
+        """
+        if self._file is None:
+            await run_in_executor(self._write_to_file, b"")
+
+    def _write_to_file(self, data: bytes) -> None:
+        if self._file is None:
+            self._file = tempfile.TemporaryFile()
+            self._file.write(self._buffer)
+            self._buffer = bytearray()
+        self._file.write(data)
+
+    async def read(self, size: int = -1) -> bytes:
+        if self._file is None:
+            end = len(self._buffer) if size < 0 else self._position + size
+            data = bytes(self._buffer[self._position : end])
+        else:
+            data = await run_in_executor(self._read_from_file, size)
+        self._position += len(data)
+        return data
+
+    def _read_from_file(self, size: int) -> bytes:
+        self._file.seek(self._position)  # type: ignore
+        return self._file.read(size)  # type: ignore
+
+    async def seek(self, offset: int) -> None:
+        self._position = max(offset, 0)
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self.stream()
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        while True:
+            chunk = await self.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    async def save(self, path: Path) -> None:
+        if self._file is None:
+            await run_in_executor(Path(path).write_bytes, bytes(self._buffer))
+        else:
+            await run_in_executor(self._copy_to, path)
+
+    def _copy_to(self, path: Path) -> None:
+        self._file.seek(0)  # type: ignore
+        with open(path, "wb") as target:
+            shutil.copyfileobj(self._file, target)  # type: ignore
+
+    async def close(self) -> None:
+        if self._file is not None:
+            await run_in_executor(self._file.close)
+            self._file = None
+        self._buffer = bytearray()
+
+
+def parse_options(value: str) -> Tuple[str, Dict[str, str]]:
+    """
+    Splits a header value into its main value and parameters
+
+    So 'form-data; name="upload"; filename="a.txt"' would become
+    ('form-data', {'name': 'upload', 'filename': 'a.txt'})
+    """
+    main, _, rest = value.partition(";")
+    options: Dict[str, str] = {}
+    while rest:
+        key, _, rest = rest.partition("=")
+        key = key.strip().lower()
+        rest = rest.lstrip()
+        if rest.startswith('"'):
+            position = 1
+            chars = []
+            while position < len(rest) and rest[position] != '"':
+                if rest[position] == "\\" and position + 1 < len(rest):
+                    position += 1
+                chars.append(rest[position])
+                position += 1
+            option = "".join(chars)
+            rest = rest[position + 1 :].partition(";")[2]
+        else:
+            option, _, rest = rest.partition(";")
+            option = option.strip()
+        if key.endswith("*"):
+            # RFC 5987 extended value, like UTF-8''na%C3%AFve.txt
+            charset, _, encoded = option.partition("'")
+            option = unquote(encoded.partition("'")[2], charset or "utf-8")
+            key = key[:-1]
+        elif key in options:
+            continue
+        if key:
+            options[key] = option
+    return main.strip().lower(), options
+
+
+class MultipartParser:
+    """
+    Parses a multipart/form-data body as it arrives
+
+    Only the unsearched tail of the body is held in memory along with fields
+    and uploads, which together are kept within memory_limit by moving uploads
+    to temporary files early, so memory stays bounded no matter how big the
+    body is or how many parts it has. Fields without a filename are kept as
+    strings, files become UploadFiles.
+    """
+
+    def __init__(
+        self,
+        boundary: bytes,
+        spool_size: int = 1048576,
+        max_field_size: int = 1048576,
+        memory_limit: int = 4194304,
+        max_files: int = 1000,
+        max_fields: int = 1000,
+    ) -> None:
+        self.delimiter = b"\r\n--" + boundary
+        self.spool_size = spool_size
+        self.max_field_size = max_field_size
+        self.memory_limit = memory_limit
+        self.max_files = max_files
+        self.max_fields = max_fields
+        self.memory_used = 0
+        self._field_count = 0
+        self.fields: Dict[str, List[Any]] = {}
+        self.uploads: List[UploadFile] = []
+        # The leading CRLF is absent before the first boundary, adding one lets
+        # every boundary be found the same way
+        self._buffer = bytearray(b"\r\n")
+        self._state = "preamble"
+        self._name = ""
+        self._field: Optional[bytearray] = None
+        self._upload: Optional[UploadFile] = None
+
+    async def parse(self, stream: AsyncIterable[bytes]) -> Dict[str, Any]:
+        try:
+            async for chunk in stream:
+                if chunk:
+                    self._buffer += chunk
+                    await self._process()
+                if self._state == "done":
+                    break
+        except BaseException:
+            await self.close()
+            raise
+        if self._state != "done":
+            await self.close()
+            raise HTTPError(400, "Incomplete multipart body")
+        return {
+            name: values[0] if len(values) == 1 else values
+            for name, values in self.fields.items()
+        }
+
+    async def close(self) -> None:
+        for upload in self.uploads:
+            await upload.close()
+
+    async def _process(self) -> None:
+        while self._state != "done":
+            if self._state == "preamble":
+                index = self._buffer.find(self.delimiter)
+                if index < 0:
+                    del self._buffer[: -len(self.delimiter)]
+                    return
+                del self._buffer[: index + len(self.delimiter)]
+                self._state = "boundary"
+            elif self._state == "boundary":
+                if len(self._buffer) < 2:
+                    return
+                if self._buffer.startswith(b"--"):
+                    self._state = "done"
+                    return
+                line_end = self._buffer.find(b"\r\n")
+                if line_end < 0:
+                    return
+                del self._buffer[: line_end + 2]
+                self._state = "headers"
+            elif self._state == "headers":
+                index = self._buffer.find(b"\r\n\r\n")
+                if index < 0:
+                    if len(self._buffer) > MAX_HEADER_SIZE:
+                        raise HTTPError(400, "Multipart part headers are too large")
+                    return
+                headers = bytes(self._buffer[:index])
+                del self._buffer[: index + 4]
+                self._start_part(headers)
+                self._state = "body"
+            elif self._state == "body":
+                index = self._buffer.find(self.delimiter)
+                if index < 0:
+                    # Keep back enough to catch a delimiter split across chunks
+                    keep = len(self.delimiter) - 1
+                    if len(self._buffer) > keep:
+                        await self._part_data(bytes(self._buffer[:-keep]))
+                        del self._buffer[:-keep]
+                    return
+                await self._part_data(bytes(self._buffer[:index]))
+                del self._buffer[: index + len(self.delimiter)]
+                self._end_part()
+                self._state = "boundary"
+
+    def _start_part(self, raw_headers: bytes) -> None:
+        headers: Dict[str, str] = {}
+        for line in raw_headers.decode("utf-8", "replace").split("\r\n"):
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+        disposition, options = parse_options(headers.get("content-disposition", ""))
+        if disposition != "form-data" or "name" not in options:
+            raise HTTPError(400, "Multipart part has no form-data name")
+        self._name = options["name"]
+        if "filename" in options:
+            if len(self.uploads) >= self.max_files:
+                raise HTTPError(413, f"More than {self.max_files} files were sent")
+            self._upload = UploadFile(
+                self._name,
+                options["filename"],
+                headers.get("content-type"),
+                headers,
+                self.spool_size,
+            )
+            self.uploads.append(self._upload)
+        else:
+            if self._field_count >= self.max_fields:
+                raise HTTPError(413, f"More than {self.max_fields} fields were sent")
+            self._field_count += 1
+            self._field = bytearray()
+
+    async def _part_data(self, data: bytes) -> None:
+        if not data:
+            return
+        if self._upload is not None:
+            upload = self._upload
+            if upload.in_memory and self.memory_used + len(data) > self.memory_limit:
+                self.memory_used -= upload.memory_size
+                await upload.rollover()
+            before = upload.memory_size
+            await upload.write(data)
+            self.memory_used += upload.memory_size - before
+        elif self._field is not None:
+            if len(self._field) + len(data) > self.max_field_size:
+                raise HTTPError(413, f"Form field {self._name} is too large")
+            if self.memory_used + len(data) > self.memory_limit:
+                raise HTTPError(413, "Form fields are too large")
+            self._field += data
+            self.memory_used += len(data)
+
+    def _end_part(self) -> None:
+        if self._upload is not None:
+            value: Any = self._upload
+            self._upload = None
+        else:
+            try:
+                value = bytes(self._field or b"").decode("utf-8")
+            except UnicodeDecodeError:
+                raise HTTPError(400, f"Form field {self._name} is not valid UTF-8")
+            self._field = None
+        self.fields.setdefault(self._name, []).append(value)
@@ -0,0 +1,145 @@
+from typing import AsyncIterator, List, Optional, Tuple
+from uuid import uuid4
+
+from tonberry.contexted.request import Request
+from tonberry.contexted.response import Response
+from tonberry.util import File
+
+# More ranges than this in one request is treated as no Range header at all,
+# so a client can't make the server build a huge multipart response
+MAX_RANGES = 16
+
+ByteRange = Tuple[int, int]
+
+
+def parse_range(header: str, size: int) -> Optional[List[ByteRange]]:
+    """
+    Turns a Range header into (start, end) pairs for a resource of the given size,
+    end being exclusive
+
+    So "bytes=0-99, -50" for 1000 bytes would become [(0, 100), (950, 1000)].
+    Returns None if the header is malformed, in which case it should be ignored,
+    and an empty list if none of the ranges can be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+    ranges = []
+    specified = False
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        specified = True
+        first, dash, last = part.partition("-")
+        if not dash or not (first or last):
+            return None
+        # int() would also take signs, spaces and underscores
+        if not all(
+            value.isascii() and value.isdigit() for value in (first, last) if value
+        ):
+            return None
+        if not first:
+            suffix = int(last)
+            if suffix == 0 or size == 0:
+                continue
+            start, end = max(size - suffix, 0), size
+        else:
+            start = int(first)
+            end = int(last) + 1 if last else size
+            if last and end <= start:
+                return None
+            if start >= size:
+                continue
+            end = min(end, size)
+        ranges.append((start, end))
+    return ranges if specified else None
+
+
+def if_range_matches(if_range: str, response: Response) -> bool:
+    """
+    If-Range holds either an entity tag, which has to be a strong match, or
+    the exact Last-Modified date of the representation
+    """
+    if_range = if_range.strip()
+    if if_range.startswith(('"', "W/")):
+        return not if_range.startswith("W/") and if_range == response.headers["ETag"]
+    return if_range == response.headers["Last-Modified"]
+
+
+async def apply_range(request: Request, response: Response) -> None:
+    """
+    Narrows a 200 response down to the byte ranges the client asked for
+
+    Only file bodies and responses that advertise Accept-Ranges are ranged.
+    A single range is sent as is with a Content-Range header, several are sent
+    as multipart/byteranges. Files are never read outside the requested ranges.
+    """
+    if response.status != 200 or request.method not in ("GET", "HEAD"):
+        return
+    body = response.body
+    file = body.file
+    if file is not None:
+        size = await file.size()
+        response.headers["Accept-Ranges"] = "bytes"
+    elif response.headers["Accept-Ranges"] == "bytes" and not body.is_streaming:
+        size = len(body.data)
+    else:
+        return
+    header = request.headers["range"]
+    if header is None:
+        return
+    if_range = request.headers["if-range"]
+    if if_range is not None and not if_range_matches(if_range, response):
+        return
+    ranges = parse_range(header, size)
+    if ranges is None or len(ranges) > MAX_RANGES:
+        return
+    if not ranges:
+        response.status = 416
+        response.headers["Content-Range"] = f"bytes */{size}"
+        response.body = b""
+        return
+    response.status = 206
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        response.headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+        # noinspection PyTypeHints
+        response.body = (  # type: ignore
+            file.window(start, end) if file is not None else body.data[start:end]
+        )
+        return
+    boundary = uuid4().hex
+    content_type = response.headers["content-type"] or "application/octet-stream"
+    part_headers = [
+        (
+            f"--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n"
+        ).encode()
+        for start, end in ranges
+    ]
+    closing = f"--{boundary}--\r\n".encode()
+    response.headers["content-length"] = sum(
+        len(part) + end - start + 2 for part, (start, end) in zip(part_headers, ranges)
+    ) + len(closing)
+    response.content_type = f"multipart/byteranges; boundary={boundary}"
+    response.body = _byteranges(file, body.data, ranges, part_headers, closing)
+
+
+async def _byteranges(
+    file: Optional[File],
+    data: bytes,
+    ranges: List[ByteRange],
+    part_headers: List[bytes],
+    closing: bytes,
+) -> AsyncIterator[bytes]:
+    for part_header, (start, end) in zip(part_headers, ranges):
+        yield part_header
+        if file is not None:
+            async for chunk in file.window(start, end).stream():
+                yield chunk
+        else:
+            yield data[start:end]
+        yield b"\r\n"
+    yield closing
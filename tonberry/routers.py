@@ -1,14 +1,18 @@
+import asyncio
 import inspect
 import json
 import mimetypes
+import time
 import urllib.parse
-from collections import namedtuple
+from collections.abc import AsyncIterable
 from dataclasses import is_dataclass
+from email.utils import formatdate, parsedate_to_datetime
 from io import IOBase, TextIOBase
 from pathlib import Path
 from typing import (
     TYPE_CHECKING,
     Any,
+    AsyncIterator,
     Callable,
     Dict,
     List,
@@ -18,15 +22,37 @@ from typing import (
     Union,
 )
 
-import dacite
-
 from tonberry import content_types
+from tonberry.binders import get_binder
+from tonberry.compression import (
+    ENCODING_EXTENSIONS,
+    RESPONSE_ENCODINGS,
+    available_encodings,
+    compress_bytes,
+    compress_file,
+    compress_stream,
+    compressed_path,
+    is_compressible,
+    parse_accept_encoding,
+    rank_encodings,
+)
 from tonberry.contexted.request import Request
 from tonberry.contexted.response import Response
-from tonberry.exceptions import FigureItOutLaterException, RouteNotFoundError
+from tonberry.exceptions import FigureItOutLaterException
 from tonberry.expose import _Expose
-from tonberry.models import Branch, Leaf, TreePart
-from tonberry.util import DataClassEncoder, File, Jinja, format_data
+from tonberry.models import (
+    Branch,
+    CallPlan,
+    Leaf,
+    ParamPlan,
+    ResponseBody,
+    RouteTrie,
+    StaticAsset,
+    StrOrBytes,
+    TreePart,
+)
+from tonberry.serializers import count_items, dumps, iterencode
+from tonberry.util import File, Jinja, format_data, run_in_executor
 
 if TYPE_CHECKING:
     from tonberry.app import App
@@ -37,13 +63,36 @@ class Router:
         self.app = app
         self._response: Response = Response()
 
-    async def format_response_body(self, result: Any) -> bytes:
+    def resolve(self, http_method: str, path: str) -> Any:
+        """
+        Returns whatever the router needs to handle the path or None if it can't
+
+        The result may be cached by the app and handed back to handle_request for
+        any later request with the same method and path.
+        """
+        raise NotImplementedError
+
+    async def handle_request(
+        self, request: Request, response: Response, match: Any = None
+    ) -> Optional[Response]:
+        """
+        Returns None if the route turns out not to be handled by this router
+        """
+        raise NotImplementedError
+
+    async def format_response_body(
+        self, result: Any, json_encoding: Optional[str] = None
+    ) -> ResponseBody:
         if isinstance(result, Jinja):
-            result = result.render()
+            if result.stream:
+                return self.stream_response_body(
+                    result.generate(self.app.config.RESPONSE_CHUNK_SIZE)
+                )
+            result = await result.render_async()
         if isinstance(result, (dict, list)) or is_dataclass(result):
             if not self._response.content_type:
                 self._response.content_type = "application/json"
-            return json.dumps(result, cls=DataClassEncoder).encode("utf-8")
+            return await self.encode_json(result, json_encoding)
         if isinstance(result, TextIOBase):
             self.app.app_logger.warning(
                 "open().read() is a blocking operation! Use tonberry.File() instead."
@@ -55,19 +104,53 @@ class Router:
             )
             return b"".join(result.readlines())
         if isinstance(result, File):
-            return await result.read()
+            return result
         if isinstance(result, str):
             return result.encode("utf-8")
         if isinstance(result, bytes):
             return result
+        if isinstance(result, AsyncIterable):
+            return self.stream_response_body(result)
         raise NotImplementedError
 
+    async def encode_json(
+        self, result: Any, json_encoding: Optional[str] = None
+    ) -> ResponseBody:
+        """
+        Encodes on the event loop ("inline"), on the executor ("thread") or
+        incrementally as the body is sent ("stream")
+
+        Without an encoding set for the endpoint, results holding at least
+        JSON_OFFLOAD_THRESHOLD items, counting everything nested in them, are
+        streamed. The thread only keeps the loop free while the encoder calls back
+        into Python, for dataclasses, the C encoders hold the GIL for plain lists
+        and dicts.
+        """
+        if json_encoding is None:
+            threshold = self.app.config.JSON_OFFLOAD_THRESHOLD
+            large = threshold and count_items(result, threshold) >= threshold
+            json_encoding = "stream" if large else "inline"
+        if json_encoding == "stream":
+            return iterencode(result, self.app.config.RESPONSE_CHUNK_SIZE)
+        if json_encoding == "thread":
+            return await run_in_executor(dumps, result)
+        return dumps(result)
+
+    @staticmethod
+    async def stream_response_body(
+        result: "AsyncIterable[StrOrBytes]",
+    ) -> AsyncIterator[bytes]:
+        async for chunk in result:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if chunk:
+                yield chunk
 
-class DynamicRouter(Router):
-    async def handle_request(self, request: Request, response: Response) -> Response:
-        raise NotImplementedError
 
-    async def handle_ws_request(self, request: Request) -> Tuple[Callable, List[Any]]:
+class DynamicRouter(Router):
+    async def handle_ws_request(
+        self, request: Request
+    ) -> Optional[Tuple[Callable, List[Any]]]:
         raise NotImplementedError
 
 
@@ -78,6 +161,7 @@ class MethodRouter(DynamicRouter):
         self.method_registration = _Expose._registrar
         self._root: Optional[Type] = None
         self._tree: Optional[TreePart] = None
+        self._trie: Optional[RouteTrie] = None
 
     @property
     def root(self) -> Optional[Type]:
@@ -87,39 +171,119 @@ class MethodRouter(DynamicRouter):
     def root(self, root: Type) -> None:
         self._root = root
         self._tree = Branch("", root, self.build_tree(root))
-
-    def set_content_type_from_annotation(self, annotation) -> None:  # type: ignore
-        if not self._response.content_type and annotation in content_types.ContentTypes:
-            self._response.content_type = content_types.CONTENT_TYPE_MAP[annotation]
-
-    async def handle_request(self, request: Request, response: Response) -> Response:
+        self._trie = RouteTrie.compile(self._tree)
+        self.app.clear_route_cache()
+
+    async def handle_request(
+        self,
+        request: Request,
+        response: Response,
+        match: Tuple[Leaf, Tuple[str, ...]] = None,
+    ) -> Optional[Response]:
+        if match is None:
+            match = self.resolve(request.method, request.path)
+            if match is None:
+                return None
         self._response = response
         response.status = 200
+        body = await self._dispatch(request, match)
+        if body is None:
+            return None
         # noinspection PyTypeHints
-        response.body = await self._dispatch(request)  # type: ignore
+        response.body = body  # type: ignore
+        if self.app.config.COMPRESS_RESPONSES:
+            await self.compress_response(request, response)
         return response
 
-    async def handle_ws_request(self, request: Request) -> Tuple[Callable, List[Any]]:
-        func = self.get_func(request)
+    async def compress_response(self, request: Request, response: Response) -> None:
+        """
+        Compresses the body with whichever of gzip or deflate the client prefers
+
+        Streamed bodies are compressed as they are sent rather than buffered and
+        bodies of COMPRESSION_OFFLOAD_SIZE or more are compressed on the executor.
+        """
+        config = self.app.config
+        body = response.body
+        if (
+            body.file is not None
+            or "content-encoding" in response.headers
+            or not is_compressible(response.headers["content-type"])
+        ):
+            return
+        if not body.is_streaming and len(body.data) < config.COMPRESSION_MIN_SIZE:
+            return
+        response.headers["Vary"] = "Accept-Encoding"
+        accepted = parse_accept_encoding(request.headers["accept-encoding"])
+        ranked = rank_encodings(accepted, RESPONSE_ENCODINGS)
+        if not ranked:
+            return
+        encoding = ranked[0]
+        if body.stream is not None:
+            # noinspection PyTypeHints
+            response.body = compress_stream(  # type: ignore
+                body.stream,
+                encoding,
+                config.COMPRESSION_LEVEL,
+                config.COMPRESSION_OFFLOAD_SIZE,
+            )
+        else:
+            if len(body.data) >= config.COMPRESSION_OFFLOAD_SIZE:
+                compressed = await run_in_executor(
+                    compress_bytes, body.data, encoding, config.COMPRESSION_LEVEL
+                )
+            else:
+                compressed = compress_bytes(
+                    body.data, encoding, config.COMPRESSION_LEVEL
+                )
+            if len(compressed) >= len(body.data):
+                return
+            # noinspection PyTypeHints
+            response.body = compressed  # type: ignore
+        response.headers["Content-Encoding"] = encoding
+
+    def resolve(
+        self, http_method: str, path: str
+    ) -> Optional[Tuple[Leaf, Tuple[str, ...]]]:
+        if self._trie is None:
+            raise FigureItOutLaterException
+        paths = [urllib.parse.unquote(pth) for pth in path.split("/") if pth != ""]
+        found = self._trie.find(paths, http_method)
+        if found is None:
+            return None
+        route, unsearched_path = found
+        return route, tuple(unsearched_path)
+
+    async def handle_ws_request(
+        self, request: Request
+    ) -> Optional[Tuple[Callable, List[Any]]]:
+        match = self.resolve(request.method, request.path)
+        if match is None:
+            return None
+        func = self.select_route(request, match)
         return func, self.get_args(request)
 
-    async def _dispatch(self, request: Request) -> bytes:
-        func = self.get_func(request)
-        return await self.call_func(request, func)
+    async def _dispatch(
+        self, request: Request, match: Tuple[Leaf, Tuple[str, ...]]
+    ) -> Optional[ResponseBody]:
+        func = self.select_route(request, match)
+        return await self.call_func(request, func, match[0])
 
     @staticmethod
     async def get_kwargs(request: Request) -> Dict:
         kwargs: Dict[str, Any] = {}
-        body = await request.get_body()
         content_type = request.headers["content-type"]
         if content_type is None:
             content_type = ""
 
-        if body:
-            if "json" in content_type:
-                kwargs.update(json.loads(body))
-            if content_type == "application/x-www-form-urlencoded":
-                kwargs.update(format_data(urllib.parse.parse_qs(body)))
+        if content_type.startswith("multipart/form-data"):
+            kwargs.update(await request.form())
+        else:
+            body = await request.get_body()
+            if body:
+                if "json" in content_type:
+                    kwargs.update(json.loads(body))
+                if content_type == "application/x-www-form-urlencoded":
+                    kwargs.update(format_data(urllib.parse.parse_qs(body)))
 
         if request.query_string:
             kwargs.update(request.query_string)
@@ -141,92 +305,98 @@ class MethodRouter(DynamicRouter):
         )
         return args
 
-    async def call_func(self, request: Request, func: Callable) -> bytes:
+    async def call_func(
+        self, request: Request, func: Callable, route: Leaf
+    ) -> Optional[ResponseBody]:
         kwargs = await self.get_kwargs(request)
-        args = self.get_args(request)
-
-        ArgTypes = namedtuple("ArgTypes", "positional keyword")
-        arg_types = ArgTypes(args, {})
-        sig = inspect.signature(func)
-        params = sig.parameters
-        return_annotation = getattr(sig, "return_annotation")
-        if return_annotation:
-            self.set_content_type_from_annotation(return_annotation)
-        var_pos = False
-        var_keyword = False
-        for name, param in params.items():
-            if (
-                kwargs
-                and hasattr(param, "annotation")
-                and is_dataclass(param.annotation)
-            ):
-                instance = dacite.from_dict(param.annotation, kwargs)
-                for key in list(kwargs.keys()):
-                    if hasattr(instance, key):
-                        del kwargs[key]
-                arg_types.positional.append(instance)
-            if name in kwargs:
-                if param.kind in (
-                    inspect.Parameter.POSITIONAL_ONLY,
-                    inspect.Parameter.POSITIONAL_OR_KEYWORD,
-                    inspect.Parameter.VAR_POSITIONAL,
-                ):
-                    arg_types.positional.append(kwargs.pop(name))
+        positional = self.get_args(request)
+        keyword: Dict[str, Any] = {}
+        call_plan = route.call_plan
+
+        if call_plan.content_type and not self._response.content_type:
+            self._response.content_type = call_plan.content_type
+
+        for param in call_plan.params:
+            if kwargs and param.binder is not None:
+                positional.append(param.binder(kwargs))
+                for key in param.binder_fields:
+                    kwargs.pop(key, None)
+            if param.name in kwargs:
+                if param.positional:
+                    positional.append(kwargs.pop(param.name))
                 else:
-                    arg_types.keyword[name] = kwargs.pop(name)
-            if param.kind == inspect.Parameter.VAR_POSITIONAL:
-                var_pos = True
-            if param.kind == inspect.Parameter.VAR_KEYWORD:
-                var_keyword = True
+                    keyword[param.name] = kwargs.pop(param.name)
 
-        for key in list(kwargs.keys()):
-            if var_pos:
-                arg_types.positional.append(kwargs.pop(key))
-            elif var_keyword:
-                arg_types.keyword[key] = kwargs.pop(key)
+        if kwargs:
+            if call_plan.var_positional:
+                positional.extend(kwargs.values())
+                kwargs = {}
+            elif call_plan.var_keyword:
+                keyword.update(kwargs)
+                kwargs = {}
 
         if func is not None and not kwargs:
-            result = await func(*arg_types.positional, **arg_types.keyword)
-            return await self.format_response_body(result)
+            result = await func(*positional, **keyword)
+            return await self.format_response_body(result, call_plan.json_encoding)
 
-        raise RouteNotFoundError
+        return None
 
-    def get_func(self, request: Request) -> Callable:
-        http_method = request.method
-        url_path = request.path
-        paths = [urllib.parse.unquote(pth) for pth in url_path.split("/") if pth != ""]
-        paths.append("index")
-        if self._tree is None:
-            raise FigureItOutLaterException
-        route = self._tree
-        level = 0
-        while isinstance(route, Branch):
-            if len(paths) <= level:
-                raise RouteNotFoundError
-            route = self.match_route(paths[level], route.children, http_method)
-            level += 1
-        if route and isinstance(route, Leaf):
-            request._unsearched_path = "/".join(paths[level:])
-            request.current_route = route
-            if route.route_mapping.func is not None:
-                return route.route_mapping.func
+    @staticmethod
+    def build_call_plan(
+        func: Callable, json_encoding: Optional[str] = None
+    ) -> CallPlan:
+        sig = inspect.signature(func)
+        params = []
+        var_positional = False
+        var_keyword = False
+        for name, param in sig.parameters.items():
+            if param.kind == inspect.Parameter.VAR_POSITIONAL:
+                var_positional = True
+            elif param.kind == inspect.Parameter.VAR_KEYWORD:
+                var_keyword = True
+            annotation = param.annotation
+            if is_dataclass(annotation) and isinstance(annotation, type):
+                binder = get_binder(annotation)
+                binder_fields = binder.field_names
             else:
-                raise FigureItOutLaterException
-        else:
-            raise RouteNotFoundError
+                binder = None
+                binder_fields = frozenset()
+            params.append(
+                ParamPlan(
+                    name,
+                    param.kind
+                    in (
+                        inspect.Parameter.POSITIONAL_ONLY,
+                        inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                        inspect.Parameter.VAR_POSITIONAL,
+                    ),
+                    binder,
+                    binder_fields,
+                )
+            )
+        try:
+            content_type = content_types.CONTENT_TYPE_MAP.get(sig.return_annotation)
+        except TypeError:
+            content_type = None
+        return CallPlan(
+            tuple(params), var_positional, var_keyword, content_type, json_encoding
+        )
+
+    def get_func(self, request: Request) -> Optional[Callable]:
+        match = self.resolve(request.method, request.path)
+        if match is None:
+            return None
+        return self.select_route(request, match)
 
     @staticmethod
-    def match_route(
-        current_path: str, routes: List[TreePart], http_method: str
-    ) -> TreePart:
-        for route in routes:
-            if route.route == current_path:
-                if isinstance(route, Leaf):
-                    if route.route_mapping.http_method == http_method:
-                        return route
-                elif isinstance(route, Branch):
-                    return route
-        raise RouteNotFoundError
+    def select_route(request: Request, match: Tuple[Leaf, Tuple[str, ...]]) -> Callable:
+        route, unsearched_path = match
+        request._unsearched_path = "/".join(unsearched_path)
+        request.current_route = route
+        if route.route_mapping.func is not None:
+            return route.route_mapping.func
+        else:
+            raise FigureItOutLaterException
 
     def build_tree(self, cls: Type) -> List[TreePart]:
         children: List[TreePart] = []
@@ -251,7 +421,16 @@ class MethodRouter(DynamicRouter):
                     )
                     mappings = {mapping for mapping in mappings if mapping}
                     for mapping in mappings:
-                        children.append(Leaf(mapping.route, cls, mapping))
+                        children.append(
+                            Leaf(
+                                mapping.route,
+                                cls,
+                                mapping,
+                                self.build_call_plan(
+                                    mapping.func, mapping.json_encoding  # type: ignore
+                                ),
+                            )
+                        )
 
         return children
 
@@ -260,29 +439,166 @@ class StaticRouter(Router):
     def __init__(self, app: "App", path_root: Union[str, Path], route: str = ""):
         super().__init__(app)
         self.route = route
+        self.prefix = tuple(segment for segment in route.split("/") if segment)
         if isinstance(path_root, str):
             path_root = Path(path_root)
         self.path_root = path_root.absolute().resolve()
-
-    async def handle_request(self, request: Request, response: Response) -> Response:
-        if request.path.startswith(self.route):
-            self._response = response
-            response.status = 200
-            # noinspection PyTypeHints
-            response.body = await self._dispatch(request)  # type: ignore
+        self._compressing: Dict[Tuple[Path, str], "asyncio.Future"] = {}
+
+    async def handle_request(
+        self, request: Request, response: Response, match: Path = None
+    ) -> Optional[Response]:
+        if match is None:
+            match = self.resolve(request.method, request.path)
+            if match is None:
+                return None
+        asset = await self.get_asset(match)
+        if asset is None:
+            return None
+        variant = asset
+        encoding = asset.encoding
+        if encoding is None and self.app.config.STATIC_PRECOMPRESSED:
+            response.headers["Vary"] = "Accept-Encoding"
+            encoded = await self.get_encoded_variant(request, asset)
+            if encoded is not None:
+                encoding, variant = encoded
+        response.headers["ETag"] = variant.etag
+        response.headers["Last-Modified"] = variant.last_modified
+        if self.not_modified(request, variant):
+            response.status = 304
             return response
-        raise RouteNotFoundError
+        response.status = 200
+        response.headers["Accept-Ranges"] = "bytes"
+        if asset.mime_type:
+            response.content_type = asset.mime_type
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        # noinspection PyTypeHints
+        response.body = (  # type: ignore
+            variant.data if variant.data is not None else File(variant.path)
+        )
+        return response
 
-    async def _dispatch(self, request: Request) -> bytes:
-        file = (
-            self.path_root / request.path.replace(f"{self.route}/", "", 1)
-        ).resolve()
+    async def get_encoded_variant(
+        self, request: Request, asset: StaticAsset
+    ) -> Optional[Tuple[str, StaticAsset]]:
+        """
+        Picks the best precompressed sibling of the asset (app.js.br, app.js.gz)
+        that the client accepts, ignoring any older than the asset itself
+        """
+        accepted = parse_accept_encoding(request.headers["accept-encoding"])
+        ranked = rank_encodings(accepted, ENCODING_EXTENSIONS)
+        for encoding in ranked:
+            variant = await self.get_asset(compressed_path(asset.path, encoding))
+            if variant is not None and variant.mtime_ns >= asset.mtime_ns:
+                return encoding, variant
+        if (
+            ranked
+            and self.app.config.STATIC_COMPRESS_MISSING
+            and asset.size >= self.app.config.COMPRESSION_MIN_SIZE
+            and is_compressible(asset.mime_type)
+        ):
+            for encoding in ranked:
+                if encoding in available_encodings():
+                    self.compress_in_background(asset.path, encoding)
+                    break
+        return None
+
+    def compress_in_background(self, file: Path, encoding: str) -> None:
+        key = (file, encoding)
+        if key in self._compressing:
+            return
+
+        async def compress() -> None:
+            try:
+                target = await run_in_executor(compress_file, file, encoding)
+                self.app.static_cache.pop(target)
+                self.app.static_miss_cache.pop(target)
+            except OSError as err:
+                self.app.app_logger.warning(
+                    f"Could not write {encoding} copy of {file}: {err}"
+                )
+            finally:
+                del self._compressing[key]
+
+        self._compressing[key] = asyncio.ensure_future(compress())
+
+    def resolve(self, http_method: str, path: str) -> Optional[Path]:
+        segments = [segment for segment in path.split("/") if segment]
+        prefix_length = len(self.prefix)
+        if tuple(segments[:prefix_length]) != self.prefix:
+            return None
+        if ".." in segments:
+            return None
+        file = self.path_root.joinpath(*segments[prefix_length:]).resolve()
         if file.is_file():
-            mime_type, encoding = mimetypes.guess_type(file.as_posix())
-            if mime_type:
-                self._response.content_type = mime_type
-            if encoding:
-                self._response.headers["Content-Encoding"] = encoding
-            file_obj = File(file)
-            return await file_obj.read()
-        raise RouteNotFoundError
+            return file
+        return None
+
+    async def get_asset(self, file: Path) -> Optional[StaticAsset]:
+        """
+        Returns the cached asset for the file, only going back to the disk when
+        the entry is older than STATIC_CACHE_REVALIDATE seconds and then only to
+        read the contents again if the size or modification time changed
+        """
+        cache = self.app.static_cache
+        misses = self.app.static_miss_cache
+        revalidate = self.app.config.STATIC_CACHE_REVALIDATE
+        if misses.get(file):
+            return None
+        asset: Optional[StaticAsset] = cache.get(file)
+        now = time.monotonic()
+        if asset is not None and now - asset.checked_at < revalidate:
+            return asset
+        try:
+            stat = await run_in_executor(file.stat)
+        except FileNotFoundError:
+            # Remembered for a while too, so looking for precompressed copies
+            # that don't exist doesn't cost a stat on every request
+            cache.pop(file)
+            misses.set(file, True, ttl=revalidate)
+            return None
+        if (
+            asset is not None
+            and asset.mtime_ns == stat.st_mtime_ns
+            and asset.size == stat.st_size
+        ):
+            asset.checked_at = now
+            return asset
+        mime_type, encoding = mimetypes.guess_type(file.as_posix())
+        data = None
+        if stat.st_size <= self.app.config.STATIC_CACHE_MAX_FILE_SIZE:
+            try:
+                data = await run_in_executor(file.read_bytes)
+            except FileNotFoundError:
+                cache.pop(file)
+                misses.set(file, True, ttl=revalidate)
+                return None
+        asset = StaticAsset(
+            path=file,
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            etag=f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+            last_modified=formatdate(stat.st_mtime, usegmt=True),
+            mime_type=mime_type,
+            encoding=encoding,
+            data=data,
+            checked_at=now,
+        )
+        cache.set(file, asset, size=len(data) if data is not None else 0)
+        return asset
+
+    @staticmethod
+    def not_modified(request: Request, asset: StaticAsset) -> bool:
+        if_none_match = request.headers["if-none-match"]
+        if if_none_match is not None:
+            etags = {etag.strip() for etag in if_none_match.split(",")}
+            return "*" in etags or asset.etag in etags or f"W/{asset.etag}" in etags
+        if_modified_since = request.headers["if-modified-since"]
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError, IndexError):
+                return False
+            return asset.mtime_ns // 1_000_000_000 <= since
+        return False
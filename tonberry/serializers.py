@@ -0,0 +1,220 @@
+import asyncio
+import json
+from dataclasses import fields, is_dataclass
+from operator import attrgetter
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Type,
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
+# How an endpoint's JSON results are encoded: on the event loop, on the executor
+# or incrementally while the body is sent
+JSON_ENCODINGS = ("inline", "thread", "stream")
+
+# Types that never hold other values, skipped when counting items
+_SCALARS = frozenset((str, int, float, bool, type(None)))
+
+Serializer = Callable[[Any], Dict[str, Any]]
+JSONDumps = Callable[[Any], bytes]
+
+_serializers: Dict[Type, Serializer] = {}
+_backends: Dict[str, JSONDumps] = {}
+_backend: Optional[JSONDumps] = None
+
+
+def get_serializer(data_class: Type) -> Serializer:
+    """
+    Returns the cached serializer for a dataclass, compiling it the first time
+    """
+    serializer = _serializers.get(data_class)
+    if serializer is None:
+        serializer = compile_serializer(data_class)
+        _serializers[data_class] = serializer
+    return serializer
+
+
+def compile_serializer(data_class: Type) -> Serializer:
+    """
+    Builds a function that maps a dataclass instance's field names to its values
+
+    Unlike dataclasses.asdict nothing is copied, field values are handed to the
+    encoder as they are and nested dataclasses are serialized as it reaches them.
+    """
+    names = tuple(data_field.name for data_field in fields(data_class))
+    if not names:
+        return lambda obj: {}
+    if len(names) == 1:
+        name = names[0]
+        return lambda obj: {name: getattr(obj, name)}
+    getter = attrgetter(*names)
+    return lambda obj: dict(zip(names, getter(obj)))
+
+
+class DataClassEncoder(json.JSONEncoder):
+    def default(self, obj: Any) -> Any:
+        if is_dataclass(obj) and not isinstance(obj, type):
+            return get_serializer(type(obj))(obj)
+        return json.JSONEncoder.default(self, obj)
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, cls=DataClassEncoder).encode("utf-8")
+
+
+def _orjson_dumps(obj: Any) -> bytes:
+    # orjson writes dataclasses itself, straight from the instance
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+def register_json_backend(name: str, dumps: JSONDumps) -> None:
+    """
+    Makes a JSON encoder available to the JSON_BACKEND config setting
+
+    The function has to return UTF-8 encoded bytes and cope with dataclasses.
+    """
+    global _backend
+    _backends[name] = dumps
+    _backend = None
+
+
+def get_json_backend() -> JSONDumps:
+    """
+    Returns the encoder named by JSON_BACKEND, the standard library json module
+    by default, "auto" picks orjson when it is installed
+    """
+    global _backend
+    if _backend is None:
+        from tonberry import config
+
+        name = config.JSON_BACKEND
+        if name == "auto":
+            name = "orjson" if "orjson" in _backends else "json"
+        if name not in _backends:
+            raise ValueError(
+                f"Unknown JSON backend {name!r}, "
+                f"expected one of {', '.join(['auto', *_backends])}"
+            )
+        _backend = _backends[name]
+    return _backend
+
+
+def dumps(obj: Any) -> bytes:
+    return get_json_backend()(obj)
+
+
+def count_items(obj: Any, limit: int) -> int:
+    """
+    Counts the list items and dict entries in obj and everything nested in it,
+    giving up once limit is reached
+    """
+    count = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            children: Collection[Any] = item.values()
+        elif isinstance(item, (list, tuple)):
+            children = item
+        elif is_dataclass(item) and not isinstance(item, type):
+            children = get_serializer(type(item))(item).values()
+        else:
+            continue
+        count += len(children)
+        if count >= limit:
+            break
+        stack.extend([child for child in children if type(child) not in _SCALARS])
+    return count
+
+
+def _encode_parts(obj: Any, encode: JSONDumps, split_items: int) -> Iterator[bytes]:
+    # Runs of small elements are encoded together in one container, so the
+    # backend is called about once per split_items items, and elements with more
+    # than that nested inside them are split up the same way
+    if is_dataclass(obj) and not isinstance(obj, type):
+        obj = get_serializer(type(obj))(obj)
+    if not isinstance(obj, (dict, list, tuple)) or (
+        count_items(obj, split_items) < split_items
+    ):
+        yield encode(obj)
+        return
+    is_dict = isinstance(obj, dict)
+    items: Iterable[Any] = obj.items() if isinstance(obj, dict) else obj
+    separator = encode([0, 0])[2:-2]
+    yield b"{" if is_dict else b"["
+    run: List[Any] = []
+    run_items = 0
+    first = True
+    for item in items:
+        value = item[1] if is_dict else item
+        size = 0 if type(value) in _SCALARS else count_items(value, split_items)
+        if size < split_items:
+            run.append(item)
+            run_items += size + 1
+            if run_items < split_items:
+                continue
+        if run:
+            if not first:
+                yield separator
+            yield encode(dict(run) if is_dict else run)[1:-1]
+            first = False
+            run = []
+            run_items = 0
+        if size >= split_items:
+            if not first:
+                yield separator
+            if is_dict:
+                # Leaves key conversion to the backend
+                yield encode({item[0]: 0})[1:-2]
+            yield from _encode_parts(value, encode, split_items)
+            first = False
+    if run:
+        if not first:
+            yield separator
+        yield encode(dict(run) if is_dict else run)[1:-1]
+    yield b"}" if is_dict else b"]"
+
+
+async def iterencode(
+    obj: Any, chunk_size: int, split_items: int = 1024
+) -> AsyncIterator[bytes]:
+    """
+    Encodes obj with the JSON backend a piece at a time, handing out chunks of at
+    least chunk_size bytes
+
+    Lists and dicts holding split_items or more items, counting everything nested
+    in them, are broken up into pieces of about that many items, however deep
+    they are. Other tasks get a turn on the event loop after each chunk, so a
+    huge result never holds the loop for longer than encoding one chunk takes.
+    The output is the same as encoding obj in one go. JSONEncoder.iterencode
+    isn't used as it can only do this with the pure Python encoder, which is
+    several times slower.
+    """
+    pieces = []
+    buffered = 0
+    for piece in _encode_parts(obj, get_json_backend(), split_items):
+        pieces.append(piece)
+        buffered += len(piece)
+        if buffered >= chunk_size:
+            yield b"".join(pieces)
+            pieces = []
+            buffered = 0
+            await asyncio.sleep(0)
+    yield b"".join(pieces)
+
+
+register_json_backend("json", _stdlib_dumps)
+if orjson is not None:
+    register_json_backend("orjson", _orjson_dumps)
@@ -0,0 +1,255 @@
+import asyncio
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from logging import getLogger
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Union
+from uuid import UUID
+
+from tonberry.util import run_in_executor
+
+
+class SessionBackend:
+    """
+    Storage for session data that lives outside of the worker process, the app
+    keeps recently used sessions in its own SessionStore in front of it
+    """
+
+    async def open(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def load(self, session_id: UUID) -> Optional[Dict]:
+        """
+        Returns the session's data or None if it doesn't exist or has expired
+        """
+        raise NotImplementedError
+
+    async def save(self, session_id: UUID, data: Dict) -> None:
+        raise NotImplementedError
+
+    def digest(self, data: Dict) -> bytes:
+        """
+        Returns a fingerprint of the data, the app compares it before and after a
+        request to notice changes made in place, like appending to a list
+        """
+        return hashlib.blake2b(pickle.dumps(data, pickle.HIGHEST_PROTOCOL)).digest()
+
+    async def touch(self, session_id: UUID) -> None:
+        """
+        Marks a session that was read but not changed as still in use
+        """
+        pass
+
+    async def delete(self, session_id: UUID) -> None:
+        raise NotImplementedError
+
+    async def snapshot(self, path: Path) -> None:
+        """
+        Writes all live sessions to a file that restore can read back
+        """
+        raise NotImplementedError
+
+    async def restore(self, path: Path) -> None:
+        raise NotImplementedError
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    Keeps sessions in a SQLite database that every worker on the host opens, so
+    any worker can serve any session
+
+    Changes are held back and written together in one transaction every
+    flush_interval seconds, or sooner once batch_size of them have built up, so
+    a crash loses at most the last interval of changes. Session data is pickled,
+    the database should only be writable by the app.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        ttl: float = 1800.0,
+        flush_interval: float = 0.5,
+        batch_size: int = 256,
+    ) -> None:
+        self.path = str(path)
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.reads = 0
+        self.writes = 0
+        self.flushes = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # Pickled data waiting to be written, None marks a delete
+        self._pending: Dict[UUID, Optional[bytes]] = {}
+        self._touched: Set[UUID] = set()
+        self._flusher: Optional["asyncio.Task[None]"] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._last_purge = 0.0
+
+    async def open(self) -> None:
+        if self._connection is None:
+            self._connection = await run_in_executor(self._connect)
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.ensure_future(self._flush_periodically())
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self._connection is not None:
+            await self.flush()
+            await run_in_executor(self._connection.close)
+            self._connection = None
+
+    async def load(self, session_id: UUID) -> Optional[Dict]:
+        if session_id in self._pending:
+            data = self._pending[session_id]
+        else:
+            self.reads += 1
+            data = await run_in_executor(self._select, str(session_id))
+        return None if data is None else pickle.loads(data)
+
+    async def save(self, session_id: UUID, data: Dict) -> None:
+        self._pending[session_id] = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+        self._touched.discard(session_id)
+        self._request_flush()
+
+    async def touch(self, session_id: UUID) -> None:
+        if session_id not in self._pending:
+            self._touched.add(session_id)
+
+    async def delete(self, session_id: UUID) -> None:
+        self._pending[session_id] = None
+        self._touched.discard(session_id)
+        self._request_flush()
+
+    async def flush(self) -> None:
+        """
+        Writes out every change held back so far in a single transaction
+        """
+        if not (self._pending or self._touched):
+            return
+        pending, self._pending = self._pending, {}
+        touched, self._touched = self._touched, set()
+        try:
+            await run_in_executor(self._write, pending, touched)
+        except Exception:
+            # Put the changes back unless newer ones came in meanwhile
+            for session_id, data in pending.items():
+                self._pending.setdefault(session_id, data)
+            self._touched |= touched - self._pending.keys()
+            raise
+        self.writes += len(pending) + len(touched)
+        self.flushes += 1
+
+    async def snapshot(self, path: Path) -> None:
+        await self.flush()
+        await run_in_executor(self._backup, Path(path))
+
+    async def restore(self, path: Path) -> None:
+        await run_in_executor(self._merge, Path(path))
+
+    def _request_flush(self) -> None:
+        if len(self._pending) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)  # type: ignore
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()  # type: ignore
+            try:
+                await self.flush()
+            except Exception:
+                getLogger("Tonberry").exception("Failed to write sessions")
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA busy_timeout = 5000")
+        if self.path != ":memory:":
+            # Lets workers read while another one is writing
+            connection.execute("PRAGMA journal_mode = WAL")
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions "
+                "(id TEXT PRIMARY KEY, data BLOB NOT NULL, expires REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)"
+            )
+        return connection
+
+    def _select(self, session_id: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._connection.execute(  # type: ignore
+                "SELECT data FROM sessions WHERE id = ? AND expires > ?",
+                (session_id, time.time()),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def _write(self, pending: Dict[UUID, Optional[bytes]], touched: Set[UUID]) -> None:
+        now = time.time()
+        expires = now + self.ttl
+        saved = [
+            (str(session_id), data, expires)
+            for session_id, data in pending.items()
+            if data is not None
+        ]
+        deleted = [
+            (str(session_id),) for session_id, data in pending.items() if data is None
+        ]
+        with self._lock, self._connection as connection:  # type: ignore
+            connection.executemany(
+                "INSERT OR REPLACE INTO sessions (id, data, expires) VALUES (?, ?, ?)",
+                saved,
+            )
+            connection.executemany("DELETE FROM sessions WHERE id = ?", deleted)
+            connection.executemany(
+                "UPDATE sessions SET expires = ? WHERE id = ?",
+                [(expires, str(session_id)) for session_id in touched],
+            )
+            if now - self._last_purge > self.flush_interval * 100:
+                connection.execute("DELETE FROM sessions WHERE expires <= ?", (now,))
+                self._last_purge = now
+
+    def _backup(self, path: Path) -> None:
+        # Written next to the target and moved into place so a reader never sees
+        # half a snapshot, even with several workers writing one at shutdown
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        target = sqlite3.connect(str(temp_path))
+        try:
+            with self._lock:
+                self._connection.backup(target)  # type: ignore
+        finally:
+            target.close()
+        os.replace(temp_path, path)
+
+    def _merge(self, path: Path) -> None:
+        # Sessions already in the database are newer than the snapshot's copy
+        with self._lock:
+            connection: Any = self._connection
+            connection.execute("ATTACH DATABASE ? AS snapshot", (str(path),))
+            try:
+                with connection:
+                    connection.execute(
+                        "INSERT OR IGNORE INTO sessions (id, data, expires) "
+                        "SELECT id, data, expires FROM snapshot.sessions "
+                        "WHERE expires > ?",
+                        (time.time(),),
+                    )
+            finally:
+                connection.execute("DETACH DATABASE snapshot")
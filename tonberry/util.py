@@ -1,21 +1,34 @@
 import asyncio
-import json
+import os
+import time
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
-from dataclasses import asdict, is_dataclass
 from functools import partial
 from pathlib import Path
-from typing import Any, Dict, Union
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
 
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    TemplateSyntaxError,
+    select_autoescape,
+)
 
 from tonberry.models import StrOrBytes
-
-
-class DataClassEncoder(json.JSONEncoder):
-    def default(self, obj: Any) -> Dict[str, Any]:
-        if is_dataclass(obj):
-            return asdict(obj)
-        return json.JSONEncoder.default(self, obj)
+from tonberry.serializers import DataClassEncoder
 
 
 def decode_bytes_to_str(value: StrOrBytes) -> str:
@@ -44,42 +57,356 @@ def format_data(kwargs: Dict) -> Dict:
     return new_kwargs
 
 
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+    maxbytes: Optional[int] = None
+    currbytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class LRUCache:
+    """
+    A size bounded mapping that evicts the least recently used entry first
+
+    Entries can be given a time to live in seconds after which they are treated
+    as missing. If maxbytes is set, entries are also evicted until the sizes they
+    were stored with add up to no more than it.
+    """
+
+    def __init__(self, maxsize: int = 128, maxbytes: int = None) -> None:
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.currbytes = 0
+        self._data: "OrderedDict[Hashable, Tuple[Any, Optional[float], int]]" = (
+            OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires, size = entry
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            self.currbytes -= size
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float = None, size: int = 0) -> None:
+        if self.maxsize <= 0 or (self.maxbytes is not None and size > self.maxbytes):
+            self.pop(key)
+            return
+        expires = time.monotonic() + ttl if ttl is not None else None
+        self.pop(key)
+        self._data[key] = (value, expires, size)
+        self.currbytes += size
+        while len(self._data) > self.maxsize or (
+            self.maxbytes is not None and self.currbytes > self.maxbytes
+        ):
+            *_, evicted_size = self._data.popitem(last=False)[1]
+            self.currbytes -= evicted_size
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return default
+        self.currbytes -= entry[2]
+        return entry[0]
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.currbytes = 0
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(
+            self.hits,
+            self.misses,
+            self.evictions,
+            self.maxsize,
+            len(self._data),
+            self.maxbytes,
+            self.currbytes,
+        )
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Returns the thread pool shared by all blocking work, creating it on first use
+    """
+    global _executor
+    if _executor is None:
+        from tonberry import config
+
+        _executor = ThreadPoolExecutor(
+            max_workers=config.WORKER_THREADS, thread_name_prefix="tonberry"
+        )
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+async def run_in_executor(func: Callable, *args: Any) -> Any:
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(get_executor(), partial(func, *args))
+
+
 class File:
-    def __init__(self, path: Union[str, Path]) -> None:
+    min_chunk_size = 64 * 1024
+    max_chunk_size = 1024 * 1024
+
+    def __init__(self, path: Union[str, Path], start: int = 0, end: int = None) -> None:
         if isinstance(path, str):
             path = Path(path)
         self.path = path
-        self.chunk_size = 64
+        self.start = start
+        self.end = end
+        self._stat: Optional[os.stat_result] = None
+
+    def window(self, start: int, end: int) -> "File":
+        """
+        Returns a File covering bytes start to end (exclusive) of this one
+        """
+        window = File(self.path, self.start + start, self.start + end)
+        window._stat = self._stat
+        return window
+
+    @property
+    def is_partial(self) -> bool:
+        return self.start > 0 or self.end is not None
+
+    async def stat(self) -> os.stat_result:
+        if self._stat is None:
+            self._stat = await run_in_executor(self.path.stat)
+        return self._stat
+
+    async def size(self) -> int:
+        size = (await self.stat()).st_size
+        if self.end is not None:
+            size = min(self.end, size)
+        return max(size - self.start, 0)
 
     async def read(self) -> bytes:
-        chunks = []
-        loop = asyncio.get_event_loop()
-        pool = ThreadPoolExecutor()
-        open_file = self.path.open("rb")
-        read_func = partial(open_file.read, self.chunk_size)
-        while True:
-            chunk = await loop.run_in_executor(pool, read_func)
-            if not chunk:
-                break
-            chunks.append(chunk)
-        return b"".join(chunks)
+        if not self.is_partial:
+            return await run_in_executor(self.path.read_bytes)
+        return await run_in_executor(self._read_window, await self.size())
+
+    def _read_window(self, length: int) -> bytes:
+        with self.path.open("rb") as open_file:
+            open_file.seek(self.start)
+            return open_file.read(length)
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self.stream()
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        """
+        Reads the file in chunks that double in size up to max_chunk_size, so
+        small files take one trip to the executor and large ones only a few
+
+        Only the bytes between start and end are read.
+        """
+        remaining = await self.size() if self.end is not None else None
+        open_file = await run_in_executor(self.path.open, "rb")
+        try:
+            if self.start:
+                await run_in_executor(open_file.seek, self.start)
+            chunk_size = self.min_chunk_size
+            while remaining is None or remaining > 0:
+                if remaining is not None:
+                    chunk_size = min(chunk_size, remaining)
+                chunk = await run_in_executor(open_file.read, chunk_size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+                chunk_size = min(chunk_size * 2, self.max_chunk_size)
+        finally:
+            open_file.close()
+
+
+_environments: Dict[Tuple[Path, str, bool], Environment] = {}
+
+
+def get_environment(
+    template_path: Path, bytecode_cache_dir: str = None, enable_async: bool = False
+) -> Environment:
+    """
+    Returns the environment shared by everything rendering from the template path,
+    so a template is only loaded and compiled once per process
+    """
+    key = (Path(template_path).absolute(), bytecode_cache_dir or "", enable_async)
+    environment = _environments.get(key)
+    if environment is None:
+        environment = Environment(
+            loader=FileSystemLoader(template_path),
+            autoescape=select_autoescape(["html", "xml"]),
+            bytecode_cache=(
+                FileSystemBytecodeCache(bytecode_cache_dir)
+                if bytecode_cache_dir
+                else None
+            ),
+            enable_async=enable_async,
+        )
+        _environments[key] = environment
+    return environment
+
+
+def _join_pieces(pieces: Iterator[str], chunk_size: int) -> str:
+    """
+    Pulls pieces of rendered template until there are at least chunk_size
+    characters or it runs out
+    """
+    chunk: List[str] = []
+    buffered = 0
+    for piece in pieces:
+        chunk.append(piece)
+        buffered += len(piece)
+        if buffered >= chunk_size:
+            break
+    return "".join(chunk)
 
 
 class Jinja:
     def __init__(
-        self, template_path: Path, file_name: str = None, context: dict = None
+        self,
+        template_path: Path,
+        file_name: str = None,
+        context: dict = None,
+        bytecode_cache_dir: str = None,
+        enable_async: bool = False,
+        stream: bool = False,
+        threaded: bool = False,
     ):
         self.template_path = template_path
         self.file_name = file_name or ""
         self.context = context or {}
-        self.environment = Environment(
-            loader=FileSystemLoader(self.template_path),
-            autoescape=select_autoescape(["html", "xml"]),
+        self.bytecode_cache_dir = bytecode_cache_dir
+        self.enable_async = enable_async
+        self.stream = stream
+        self.threaded = threaded
+        self._environment: Optional[Environment] = None
+
+    @property
+    def environment(self) -> Environment:
+        if self._environment is None:
+            self._environment = get_environment(
+                self.template_path, self.bytecode_cache_dir, self.enable_async
+            )
+        return self._environment
+
+    def __call__(
+        self,
+        file_name: str,
+        context: dict,
+        stream: bool = False,
+        threaded: bool = False,
+    ) -> "Jinja":
+        """
+        stream sends the page in chunks as it is rendered instead of building the
+        whole string first and threaded does the rendering on the executor
+        """
+        jinja = Jinja(
+            self.template_path,
+            file_name,
+            context,
+            self.bytecode_cache_dir,
+            self.enable_async,
+            stream,
+            threaded,
         )
+        jinja._environment = self.environment
+        return jinja
 
-    def __call__(self, file_name: str, context: dict) -> "Jinja":
-        return Jinja(self.template_path, file_name, context)
+    def precompile(self) -> int:
+        """
+        Loads every template under the template path into the environment's cache,
+        skipping files that aren't valid templates, and returns how many it loaded
+        """
+        loaded = 0
+        for name in self.environment.list_templates():
+            try:
+                self.environment.get_template(name)
+            except (TemplateSyntaxError, UnicodeDecodeError):
+                continue
+            loaded += 1
+        return loaded
 
     def render(self) -> str:
         template = self.environment.get_template(self.file_name)
         return template.render(**self.context)
+
+    async def render_async(self) -> str:
+        """
+        Renders with Jinja's async support when the environment has it enabled,
+        otherwise on the executor if threaded is set or right here if not
+        """
+        if self.environment.is_async:
+            template = self.environment.get_template(self.file_name)
+            return await template.render_async(**self.context)
+        if self.threaded:
+            return await run_in_executor(self.render)
+        return self.render()
+
+    async def generate(self, chunk_size: int = 65536) -> AsyncIterator[str]:
+        """
+        Renders the template a chunk of roughly chunk_size characters at a time
+
+        Other tasks get a turn on the event loop between chunks, or the chunks are
+        rendered on the executor if threaded is set.
+        """
+        template = self.environment.get_template(self.file_name)
+        if self.environment.is_async:
+            chunk: List[str] = []
+            buffered = 0
+            async for piece in template.generate_async(**self.context):
+                chunk.append(piece)
+                buffered += len(piece)
+                if buffered >= chunk_size:
+                    yield "".join(chunk)
+                    chunk = []
+                    buffered = 0
+            if chunk:
+                yield "".join(chunk)
+            return
+        pieces = template.generate(**self.context)
+        while True:
+            if self.threaded:
+                text = await run_in_executor(_join_pieces, pieces, chunk_size)
+            else:
+                text = _join_pieces(pieces, chunk_size)
+            if not text:
+                break
+            yield text
+            if not self.threaded:
+                await asyncio.sleep(0)
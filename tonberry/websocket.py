@@ -5,6 +5,7 @@ from typing import TYPE_CHECKING, Any
 from tonberry.exceptions import WebSocketDisconnect
 from tonberry.header import Header
 from tonberry.models import Message, Receive, Scope, Send
+from tonberry.serializers import dumps
 
 if TYPE_CHECKING:
     from tonberry import App
@@ -107,11 +108,11 @@ class WebSocket:
 
     async def send_json(self, data: Any, mode: str = "text") -> None:
         assert mode in ["text", "binary"]
-        text = json.dumps(data)
+        encoded = dumps(data)
         if mode == "text":
-            await self.send({"type": "websocket.send", "text": text})
+            await self.send({"type": "websocket.send", "text": encoded.decode("utf-8")})
         else:
-            await self.send({"type": "websocket.send", "bytes": text.encode("utf-8")})
+            await self.send({"type": "websocket.send", "bytes": encoded})
 
     async def close(self, code: int = 1000) -> None:
         await self.send({"type": "websocket.close", "code": code})